@@ -1,14 +1,26 @@
 # --- IMPORTS ---
-import json
+import functools
+import glob
+import heapq
 import logging
-import re
+import os
+import time
 import asyncio
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from collections import deque, defaultdict
-from typing import Dict, List, Set, Deque, Optional, Any, Tuple, cast
+from enum import IntEnum
+from collections import Counter, deque, defaultdict
+from operator import itemgetter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, Deque, Optional, Tuple, cast
+import msgspec
+from aiolimiter import AsyncLimiter
 from aiogram import Bot, Dispatcher, types, F, Router
 from aiogram.client.default import DefaultBotProperties
-from aiogram.filters import Command, CommandStart, CommandObject
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.filters import Command, CommandStart, CommandObject, Filter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -19,20 +31,31 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import TelegramMethod
 
 # --- SYSTEM CONFIGURATION ---
 class Config:
     TOKEN = ""  # Get from @botfather
-    DATA_FILE = "cyber_squad_prod.json"
-    BACKUP_FILE = "cyber_squad_backup.json"
+    DATA_FILE = "cyber_squad_prod.msgpack"
+    BACKUP_FILE = "cyber_squad_backup.msgpack"
+    LEGACY_DATA_FILE = "cyber_squad_prod.json"  # Read once to migrate old installs
+    WAL_FILE = "cyber_squad.wal"  # Prefix of write-ahead log files, one per generation
     LOG_FILE = "cyber_guardian.log"
     MAX_LAST_MISSIONS = 15
     MAX_CALL_SIGN_LENGTH = 20
     ADMIN_IDS = {}  # Creator role. Uses profile ID.
     AUTO_SAVE_INTERVAL = 300  # In seconds
+    SAVE_DEBOUNCE = 0.5  # Seconds to collect changes before writing them
+    BACKUP_EVERY = 10  # Saves between rotating the previous snapshot into the backup
     TICKET_TIMEOUT = 72  # Hours until inactive ticket closure
     MAX_MESSAGE_LENGTH = 4096  # Maximum Telegram message length
     MAX_MISSION_NAME_LENGTH = 50  # Maximum mission name length
+    SEND_CONCURRENCY = 30  # Simultaneous requests during broadcasts
+    HTTP_POOL_SIZE = 100  # Connections to the Bot API, keep above SEND_CONCURRENCY
+    SEND_RATE_LIMIT = 30  # Requests per second, Telegram's global bot limit
+    CHAT_RATE_LIMIT = 1  # Requests per second to a single chat
+    CHAT_LIMITER_PRUNE_SIZE = 1000  # Tracked chats before idle limiters are dropped
+    STARTUP_NOTIFY_TIMEOUT = 5  # Seconds to wait for each administrator notification
 
 # --- LOGGING SETUP ---
 def setup_logging():
@@ -47,11 +70,48 @@ def setup_logging():
     return logging.getLogger("CyberGuard")
 logger = setup_logging()
 
+# --- RATE LIMITING ---
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Pace outgoing API requests to stay within Telegram limits"""
+    def __init__(self):
+        self.global_limiter = AsyncLimiter(Config.SEND_RATE_LIMIT, 1)
+        self.chat_limiters: Dict[Any, AsyncLimiter] = {}
+        self._prune_at = Config.CHAT_LIMITER_PRUNE_SIZE
+    
+    def _chat_limiter(self, chat_id: Any) -> AsyncLimiter:
+        """Limiter for the chat, created on first use"""
+        limiter = self.chat_limiters.get(chat_id)
+        if limiter is None:
+            if len(self.chat_limiters) >= self._prune_at:
+                self._prune_chat_limiters()
+            limiter = self.chat_limiters[chat_id] = AsyncLimiter(Config.CHAT_RATE_LIMIT, 1)
+        return limiter
+    
+    def _prune_chat_limiters(self):
+        """Drop limiters of chats whose bucket has fully drained"""
+        # A drained limiter behaves exactly like a new one, so nothing is lost
+        self.chat_limiters = {
+            chat_id: limiter for chat_id, limiter in self.chat_limiters.items()
+            if not limiter.has_capacity(limiter.max_rate)
+        }
+        # Grow the threshold with the busy set so pruning stays amortised O(1)
+        self._prune_at = max(Config.CHAT_LIMITER_PRUNE_SIZE, 2 * len(self.chat_limiters))
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            # Wait for the chat first so a busy chat doesn't hold global capacity
+            await self._chat_limiter(chat_id).acquire()
+        async with self.global_limiter:
+            return await make_request(bot, method)
+
 # --- BOT INITIALIZATION ---
 bot = Bot(
     token=Config.TOKEN,
+    session=AiohttpSession(limit=Config.HTTP_POOL_SIZE),
     default=DefaultBotProperties(parse_mode="HTML")
 )
+bot.session.middleware(RateLimitMiddleware())
 dp = Dispatcher()
 main_router = Router()
 dp.include_router(main_router)
@@ -63,12 +123,29 @@ class UnitType:
     PRIVATES = "privates"
     ALL_TYPES = [CENTURIONS, DECURIONS, PRIVATES]
 
-class MissionStatus:
-    PENDING = "Pending"
-    ACTIVE = "Active"
-    COMPLETED = "Completed"
-    APPROVED = "Approved"
-    REJECTED = "Rejected"
+class MissionStatus(IntEnum):
+    PENDING = 0
+    ACTIVE = 1
+    COMPLETED = 2
+    APPROVED = 3
+    REJECTED = 4
+    
+    @property
+    def label(self) -> str:
+        return self.name.title()
+
+class TicketStatus(IntEnum):
+    OPEN = 0
+    IN_PROGRESS = 1
+    CLOSED = 2
+    
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+def load_status(status_type: type, value: Any) -> IntEnum:
+    """Status enum from a stored value; older files stored the label string"""
+    return status_type[value.upper()] if isinstance(value, str) else status_type(value)
 
 class ButtonText:
     COMBAT_READY = "Ready for Action!"
@@ -82,7 +159,66 @@ class ButtonText:
     ACTIVE_TICKETS = "Active Tickets"
     CLOSE_TICKET = "Close Ticket"
 
+class ActionStates(StatesGroup):
+    awaiting_callsign = State()
+    awaiting_userid = State()  # FSM data holds the unit action
+
+class MissionFSM(StatesGroup):
+    awaiting_name = State()  # FSM data holds the mission type
+    awaiting_content = State()
+
+class TicketFSM(StatesGroup):
+    awaiting_text = State()
+
 # --- SYSTEM CORE ---
+FRAME_HEADER_SIZE = 4  # Big-endian payload length in front of every frame
+
+def pack_frame(payload: bytes) -> bytes:
+    """Prefix payload with its length so truncated files can be detected"""
+    return len(payload).to_bytes(FRAME_HEADER_SIZE, "big") + payload
+
+def fsync_dir(path: str):
+    """Flush directory entries so a rename of path survives a power loss"""
+    if os.name != "posix":
+        return  # Directories can't be opened for fsync on Windows
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def unpack_frame(blob: bytes) -> bytes:
+    """Return frame payload, raising if the file was cut short"""
+    size = int.from_bytes(blob[:FRAME_HEADER_SIZE], "big")
+    payload = blob[FRAME_HEADER_SIZE:]
+    if len(blob) < FRAME_HEADER_SIZE or len(payload) != size:
+        raise ValueError(f"Corrupted frame: expected {size} bytes, got {len(payload)}")
+    return payload
+
+def iter_frames(blob: bytes):
+    """Yield payloads of consecutive frames, stopping at a truncated tail"""
+    offset = 0
+    while offset + FRAME_HEADER_SIZE <= len(blob):
+        start = offset + FRAME_HEADER_SIZE
+        end = start + int.from_bytes(blob[offset:start], "big")
+        if end > len(blob):
+            break
+        yield blob[start:end]
+        offset = end
+
+def int_keys(raw: dict) -> dict:
+    """Copy of a user-id keyed dict with integer keys"""
+    return {int(k): v for k, v in raw.items()}
+
+def encode_extra(obj: Any) -> Any:
+    """Encoder hook for types msgpack can't represent directly"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise NotImplementedError(f"Unsupported type: {type(obj)}")
+
+# Sets and int keys are encoded natively, so the live data is written as-is
+snapshot_encoder = msgspec.msgpack.Encoder(enc_hook=encode_extra)
+
 class DataManager:
     def __init__(self):
         self.data = {
@@ -95,9 +231,8 @@ class DataManager:
             "command": {
                 "call_signs": {},
                 "tickets": {},
-                "activity": {},
+                "activity": {},  # Structure: {user_id: unix_timestamp}
                 "temp_actions": {},
-                "temp_missions": {},
                 "user_active_tickets": {},
                 "ticket_responses": {}  # Structure: {ticket_id: {commander_id: {chat_id, message_id}}}
             },
@@ -105,17 +240,53 @@ class DataManager:
             "combat_ready": set(),
             "usernames": {}  # Username cache
         }
+        self._dirty = asyncio.Event()
+        self._save_lock = asyncio.Lock()
+        self._wal = None  # Append handle for the current log generation
+        self._wal_generation = 0
+        # Log generations covered by the data and backup files; -1 while unknown
+        self._snapshot_generation = -1
+        self._backup_generation = -1
+        self._save_count = 0
+        self.commanders: Set[int] = set()  # Administrators and centurions
+        self._sorted_units: Dict[str, List[int]] = {}  # Filled lazily per unit
+        self.active_missions: Set[str] = set()  # IDs of missions in progress
         self._load_initial_data()
+        self._build_indexes()
+        # Replayed after indexing so unit changes also update active mission targets
+        self._replay_wal()
     
     def _load_initial_data(self):
-        try:
-            with open(Config.DATA_FILE, "r", encoding='utf-8') as f:
-                raw_data = json.load(f)
-                self._convert_data(raw_data)
-            logger.info("Operational data loaded")
-        except Exception as e:
-            logger.warning(f"Initializing new data. Reason: {e}")
-            self._add_default_commanders()
+        """Load data file, falling back to the backup and then legacy JSON"""
+        sources = (
+            (Config.DATA_FILE, self._read_snapshot),
+            (Config.BACKUP_FILE, self._read_snapshot),
+            (Config.LEGACY_DATA_FILE, self._read_legacy_json),
+        )
+        errors = []
+        for path, read in sources:
+            try:
+                self._convert_data(read(path))
+                logger.info(f"Operational data loaded from {path}")
+                if path == Config.DATA_FILE:
+                    self._snapshot_generation = self._wal_generation
+                return
+            except Exception as e:
+                errors.append(f"{path}: {e}")
+        logger.warning(f"Initializing new data. Reason: {'; '.join(errors)}")
+        self._add_default_commanders()
+    
+    @staticmethod
+    def _read_snapshot(path: str) -> dict:
+        """Read a length-prefixed MessagePack snapshot"""
+        with open(path, "rb") as f:
+            return msgspec.msgpack.decode(unpack_frame(f.read()))
+    
+    @staticmethod
+    def _read_legacy_json(path: str) -> dict:
+        """Read data file written by JSON-based versions"""
+        with open(path, "rb") as f:
+            return msgspec.json.decode(f.read())
     
     def _convert_data(self, raw_data: dict):
         """Convert loaded data into working structures"""
@@ -132,28 +303,40 @@ class DataManager:
         
         archive = raw_data["missions"].get("archive", {})
         for mission_id, mission in archive.items():
-            if "completed_by" in mission:
-                mission["completed_by"] = set(mission["completed_by"])
+            # Every mission carries a completed_by set in memory
+            mission["completed_by"] = set(mission.get("completed_by", ()))
+            mission["status"] = load_status(MissionStatus, mission["status"])
+            if "recipients" in mission:
+                mission["recipients"] = set(mission["recipients"])
+            if "notified_by" in mission:
+                mission["notified_by"] = set(mission["notified_by"])
+            elif mission["status"] == MissionStatus.COMPLETED:
+                # Finished before notifications were tracked, treat them as delivered
+                mission["notified_by"] = set(mission["completed_by"])
         self.data["missions"]["archive"] = archive
+        self.data["missions"]["approvals"] = raw_data["missions"].get("approvals", {})
         
         # Конвертация command
-        self.data["command"]["call_signs"] = raw_data["command"].get("call_signs", {})
+        # Dicts keyed by user id; legacy JSON files stored those keys as strings
+        self.data["command"]["call_signs"] = int_keys(raw_data["command"].get("call_signs", {}))
+        self.data["command"]["tickets"] = raw_data["command"].get("tickets", {})
+        for ticket in self.data["command"]["tickets"].values():
+            ticket["status"] = load_status(TicketStatus, ticket["status"])
+            self._add_history_timestamps(ticket)
         activity_data = raw_data["command"].get("activity", {})
+        # Older files stored ISO strings instead of Unix timestamps
         self.data["command"]["activity"] = {
-            int(k): datetime.fromisoformat(v) 
+            int(k): v if isinstance(v, int) else int(datetime.fromisoformat(v).timestamp())
             for k, v in activity_data.items()
         }
-        self.data["command"]["temp_actions"] = raw_data["command"].get("temp_actions", {})
-        self.data["command"]["temp_missions"] = raw_data["command"].get("temp_missions", {})
-        self.data["command"]["user_active_tickets"] = raw_data["command"].get("user_active_tickets", {})
+        self.data["command"]["temp_actions"] = int_keys(raw_data["command"].get("temp_actions", {}))
+        self.data["command"]["user_active_tickets"] = int_keys(raw_data["command"].get("user_active_tickets", {}))
         
         # Конвертация ticket_responses с новой структурой
         raw_responses = raw_data["command"].get("ticket_responses", {})
         self.data["command"]["ticket_responses"] = {
-            ticket_id: {
-                int(cmdr_id): info 
-                for cmdr_id, info in responses.items()
-            } for ticket_id, responses in raw_responses.items()
+            ticket_id: int_keys(responses)
+            for ticket_id, responses in raw_responses.items()
         }
         
         # Конвертация множеств
@@ -161,77 +344,459 @@ class DataManager:
         self.data["combat_ready"] = set(raw_data.get("combat_ready", []))
         
         # Конвертация usernames
-        self.data["usernames"] = raw_data.get("usernames", {})
+        self.data["usernames"] = int_keys(raw_data.get("usernames", {}))
+        
+        # Last write-ahead log generation already contained in this snapshot
+        self._wal_generation = raw_data.get("wal_generation", 0)
+    
+    @staticmethod
+    def _add_history_timestamps(ticket: dict):
+        """Backfill numeric timestamps of tickets saved before they were stored"""
+        def to_ts(iso: Optional[str]) -> float:
+            return datetime.fromisoformat(iso).timestamp() if iso else 0.0
+        ticket.setdefault("created_at_ts", to_ts(ticket.get("created_at")))
+        for entry in (*ticket.get("messages", ()), *ticket.get("responses", ())):
+            if isinstance(entry, dict) and "time_ts" not in entry:
+                entry["time_ts"] = to_ts(entry.get("timestamp") or ticket.get("created_at"))
     
     def _add_default_commanders(self):
         """Add default command structure"""
         for admin_id in Config.ADMIN_IDS:
             self.add_commander(admin_id, UnitType.CENTURIONS)
+        self.mark_dirty()
     
     def add_commander(self, user_id: int, unit_type: str):
         """Add a commander to the system"""
         if unit_type not in UnitType.ALL_TYPES:
             raise ValueError(f"Unknown unit type: {unit_type}")
-        self.data["units"][unit_type].add(user_id)
-        self.data["command"]["activity"][user_id] = datetime.now()
+        self.add_to_unit(user_id, unit_type)
+        self.touch_activity(user_id)
         self.data["subscribers"].add(user_id)
         logger.info(f"New {unit_type} commander: {user_id}")
     
-    def save_data(self):
-        """Save data with error handling"""
-        try:
-            data_to_save = self._prepare_data_for_saving()
-            with open(Config.DATA_FILE, "w", encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-            self._create_backup(data_to_save)
-            logger.info("Data saved successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Save error: {e}")
-            return False
+    def touch_activity(self, user_id: int):
+        """Record user activity"""
+        self.data["command"]["activity"][user_id] = int(time.time())
     
-    def _prepare_data_for_saving(self) -> dict:
-        """Prepare data for serialization"""
-        return {
-            "units": {k: list(v) for k, v in self.data["units"].items()},
-            "missions": {
-                "active": list(self.data["missions"]["active"]),
-                "archive": {
-                    mid: {
-                        **mission,
-                        "completed_by": list(mission.get("completed_by", []))
-                    } for mid, mission in self.data["missions"]["archive"].items()
-                },
-                "approvals": self.data["missions"]["approvals"]
-            },
-            "command": {
-                "call_signs": self.data["command"]["call_signs"],
-                "tickets": self.data["command"]["tickets"],
-                "activity": {
-                    k: v.isoformat() for k, v in self.data["command"]["activity"].items()
-                },
-                "temp_actions": self.data["command"]["temp_actions"],
-                "temp_missions": self.data["command"]["temp_missions"],
-                "user_active_tickets": self.data["command"]["user_active_tickets"],
-                "ticket_responses": {
-                    ticket_id: {
-                        str(cmdr_id): info 
-                        for cmdr_id, info in responses.items()
-                    } for ticket_id, responses in self.data["command"]["ticket_responses"].items()
-                }
-            },
-            "subscribers": list(self.data["subscribers"]),
-            "combat_ready": list(self.data["combat_ready"]),
-            "usernames": self.data["usernames"]
+    def set_username(self, user_id: int, username: Optional[str]):
+        """Cache a username, logging it only when it changed"""
+        usernames = self.data["usernames"]
+        if user_id not in usernames or usernames[user_id] != username:
+            usernames[user_id] = username
+            self.log_op("username", user_id, username)
+    
+    def touch_usernames(self, user_ids: Iterable[int]):
+
+        """Reserve username cache entries for unknown users with a single save"""
+        usernames = self.data["usernames"]
+        missing = [user_id for user_id in user_ids if user_id not in usernames]
+        if missing:
+            usernames.update(dict.fromkeys(missing))
+            self.mark_dirty()
+    
+    def add_to_unit(self, user_id: int, unit_type: str):
+        """Add user to a unit keeping the commanders set in sync"""
+        self.data["units"][unit_type].add(user_id)
+        self._sorted_units.pop(unit_type, None)
+
+        if unit_type == UnitType.CENTURIONS:
+            self.commanders.add(user_id)
+    
+    def remove_from_unit(self, user_id: int, unit_type: str):
+        """Remove user from a unit keeping the commanders set in sync"""
+        members = self.data["units"][unit_type]
+        if user_id in members:
+            members.discard(user_id)
+            self._release_recipient(user_id, unit_type)
+        self._sorted_units.pop(unit_type, None)
+        if unit_type == UnitType.CENTURIONS and user_id not in Config.ADMIN_IDS:
+            self.commanders.discard(user_id)
+    
+    def _release_recipient(self, user_id: int, unit_type: str):
+        """Stop waiting on a user who left the units of an active mission without completing it"""
+        archive = self.data["missions"]["archive"]
+        units = self.data["units"]
+        for mission_id in self.active_missions:
+            mission = archive[mission_id]
+            recipients = mission.get("recipients")
+            if not recipients or user_id not in recipients or user_id in mission["completed_by"]:
+                continue
+            targets = mission_targets(mission["type"])
+            if unit_type in targets and not any(user_id in units[t] for t in targets):
+                recipients.discard(user_id)
+                mission["total_targets"] -= 1
+    
+    def is_in_unit(self, user_id: int, unit_type: str) -> bool:
+        """Check unit membership"""
+        return user_id in self.data["units"][unit_type]
+    
+    def sorted_unit_members(self, unit_type: str) -> List[int]:
+        """Unit members in ID order, re-sorted only after the unit changes"""
+        members = self._sorted_units.get(unit_type)
+        if members is None:
+            members = self._sorted_units[unit_type] = sorted(self.data["units"].get(unit_type, ()))
+        return members
+    
+    def _build_indexes(self):
+        """Derive lookup structures that are rebuilt on load and never saved"""
+        self.commanders = set(Config.ADMIN_IDS) | self.data["units"][UnitType.CENTURIONS]
+        self._sorted_units.clear()
+        self.active_missions.clear()
+        # Structure: {user_id: {"active": {mission_id}, "completed": {mission_id}}}
+        self.user_missions = defaultdict(lambda: {"active": set(), "completed": set()})
+        self.mission_counts = Counter()  # Missions per status
+        self.ticket_counts = Counter()  # Tickets per status
+        # Structure: {moderator_id: {ticket_id}} for tickets in progress, empty sets are dropped
+        self.moderator_tickets: Dict[int, Set[str]] = {}
+        # Structure: {user_id: {ticket_id}} for tickets the user opened or is assigned to
+        self.user_tickets: Dict[int, Set[str]] = defaultdict(set)
+        # Structure: {commander_id: {ticket_responses key}}
+        self.response_keys: Dict[int, Set[str]] = defaultdict(set)
+        for key, responses in self.data["command"]["ticket_responses"].items():
+            for commander_id in responses:
+                self.response_keys[commander_id].add(key)
+        for mission in self.data["missions"]["archive"].values():
+            self._index_mission(mission)
+        # Structure: [(expires_at_ts, ticket_id)], stale entries are skipped when popped
+        self.ticket_expiry: List[Tuple[float, str]] = []
+        for ticket in self.data["command"]["tickets"].values():
+            self._index_ticket(ticket)
+            if ticket.get("status") != TicketStatus.CLOSED:
+                if "updated_at_ts" not in ticket:
+                    ticket["updated_at_ts"] = datetime.fromisoformat(ticket["updated_at"]).timestamp()
+                self.ticket_expiry.append((self._ticket_expires_at(ticket), ticket["id"]))
+        heapq.heapify(self.ticket_expiry)
+    
+    @staticmethod
+    def _mission_bucket(mission: dict) -> Optional[str]:
+        """Index bucket for missions whose completions are tracked per user"""
+        status = mission.get("status")
+        if status == MissionStatus.ACTIVE:
+            return "active"
+        if status == MissionStatus.COMPLETED:
+            return "completed"
+        return None
+    
+    def _index_mission(self, mission: dict):
+        self.mission_counts[mission.get("status")] += 1
+        if mission.get("status") == MissionStatus.ACTIVE:
+            self.active_missions.add(mission["id"])
+        bucket = self._mission_bucket(mission)
+        if bucket:
+            for user_id in mission["completed_by"]:
+                self.user_missions[user_id][bucket].add(mission["id"])
+    
+    def _unindex_mission(self, mission: dict):
+        self.mission_counts[mission.get("status")] -= 1
+        self.active_missions.discard(mission["id"])
+        bucket = self._mission_bucket(mission)
+        if bucket:
+            for user_id in mission["completed_by"]:
+                if user_id in self.user_missions:
+                    self.user_missions[user_id][bucket].discard(mission["id"])
+    
+    def add_mission(self, mission: dict):
+        """Register a new mission in the archive and the recent list"""
+        self.data["missions"]["active"].append(mission["id"])
+        self.data["missions"]["archive"][mission["id"]] = mission
+        self._index_mission(mission)
+    
+    def set_mission_status(self, mission: dict, status: MissionStatus):
+        """Change mission status keeping indexes and counters in sync"""
+        self._unindex_mission(mission)
+        mission["status"] = status
+        self._index_mission(mission)
+    
+    def drop_mission_completion(self, mission: dict, user_id: int):
+        """Forget that a removed user completed the mission"""
+        mission["completed_by"].discard(user_id)
+        mission.get("notified_by", set()).discard(user_id)
+        recipients = mission.get("recipients")
+        if mission["status"] == MissionStatus.ACTIVE and recipients and user_id in recipients:
+            # The completion no longer counts, so neither does the recipient
+            recipients.discard(user_id)
+            mission["total_targets"] -= 1
+    
+    def record_mission_completion(self, mission: dict, user_id: int):
+        """Mark mission as done by the user"""
+        mission["completed_by"].add(user_id)
+        bucket = self._mission_bucket(mission)
+        if bucket:
+            self.user_missions[user_id][bucket].add(mission["id"])
+    
+    def _index_ticket(self, ticket: dict):
+        self.ticket_counts[ticket.get("status")] += 1
+        if ticket.get("status") == TicketStatus.IN_PROGRESS and ticket.get("assigned_to"):
+            self.moderator_tickets.setdefault(ticket["assigned_to"], set()).add(ticket["id"])
+        for user_id in (ticket.get("user_id"), ticket.get("assigned_to")):
+            if user_id:
+                self.user_tickets[user_id].add(ticket["id"])
+    
+    def _unindex_ticket(self, ticket: dict):
+        self.ticket_counts[ticket.get("status")] -= 1
+        moderator_id = ticket.get("assigned_to")
+        moderator_ticket_ids = self.moderator_tickets.get(moderator_id)
+        if moderator_ticket_ids is not None:
+            moderator_ticket_ids.discard(ticket["id"])
+            if not moderator_ticket_ids:
+                del self.moderator_tickets[moderator_id]
+        for user_id in (ticket.get("user_id"), moderator_id):
+            if user_id in self.user_tickets:
+                self.user_tickets[user_id].discard(ticket["id"])
+    
+    def add_ticket(self, ticket: dict):
+        """Register a new ticket"""
+        self.data["command"]["tickets"][ticket["id"]] = ticket
+        self._index_ticket(ticket)
+        self.touch_ticket(ticket)
+    
+    @staticmethod
+    def _ticket_expires_at(ticket: dict) -> float:
+        return ticket["updated_at_ts"] + Config.TICKET_TIMEOUT * 3600
+    
+    def touch_ticket(self, ticket: dict, now: Optional[datetime] = None):
+        """Record ticket activity and push back its expiry"""
+        now = now or datetime.now()
+        ticket["updated_at"] = now.isoformat()
+        ticket["updated_at_ts"] = now.timestamp()
+        # Closed tickets never expire, an entry for them would only be skipped later
+        if ticket.get("status") != TicketStatus.CLOSED:
+            heapq.heappush(self.ticket_expiry, (self._ticket_expires_at(ticket), ticket["id"]))
+            # Outdated entries pile up with every message, compact once they dominate
+            if len(self.ticket_expiry) > 2 * self.open_ticket_count() + 64:
+                self._rebuild_ticket_expiry()
+    
+    def _rebuild_ticket_expiry(self):
+        """Keep only the current expiry entry of each open ticket"""
+        # Filter the heap itself, closed tickets are kept forever and would make this O(all tickets)
+        tickets = self.data["command"]["tickets"]
+        current = {
+            ticket_id: expires_at for expires_at, ticket_id in self.ticket_expiry
+            if (ticket := tickets.get(ticket_id)) is not None
+            and ticket["status"] != TicketStatus.CLOSED
+            and self._ticket_expires_at(ticket) == expires_at
         }
+        self.ticket_expiry = [(expires_at, ticket_id) for ticket_id, expires_at in current.items()]
+        heapq.heapify(self.ticket_expiry)
+
+
+    
+    def pop_expired_tickets(self, now_ts: float) -> List[str]:
+        """IDs of open tickets inactive for longer than the timeout"""
+        expired = []
+        tickets = self.data["command"]["tickets"]
+        while self.ticket_expiry and self.ticket_expiry[0][0] <= now_ts:
+            expires_at, ticket_id = heapq.heappop(self.ticket_expiry)
+            ticket = tickets.get(ticket_id)
+            # Entries of closed, deleted or since updated tickets are outdated
+            if ticket and ticket["status"] != TicketStatus.CLOSED and self._ticket_expires_at(ticket) == expires_at:
+                expired.append(ticket_id)
+        return expired
+    
+    def set_ticket_status(self, ticket: dict, status: TicketStatus):
+        """Change ticket status keeping counters in sync"""
+        self._unindex_ticket(ticket)
+        ticket["status"] = status
+        self._index_ticket(ticket)
+    
+    def delete_ticket(self, ticket_id: str):
+        """Remove a ticket completely"""
+        ticket = self.data["command"]["tickets"].pop(ticket_id, None)
+        if ticket:
+            self._unindex_ticket(ticket)
+    
+    def remove_users(self, user_ids: Iterable[int]):
+        """Remove users from all data structures"""
+        ticket_responses = self.data["command"]["ticket_responses"]
+        archive = self.data["missions"]["archive"]
+        for user_id in user_ids:
+            # Remove from all units
+            for unit_type in UnitType.ALL_TYPES:
+                self.remove_from_unit(user_id, unit_type)
+            # Remove from active users
+            self.data["combat_ready"].discard(user_id)
+            # Remove from subscribers
+            self.data["subscribers"].discard(user_id)
+            # Remove from call signs
+            self.data["command"]["call_signs"].pop(user_id, None)
+            # Remove from activity
+            self.data["command"]["activity"].pop(user_id, None)
+            # Remove from temporary actions
+            self.data["command"]["temp_actions"].pop(user_id, None)
+            # Remove from active tickets
+            self.data["command"]["user_active_tickets"].pop(user_id, None)
+            # Remove from usernames
+            self.data["usernames"].pop(user_id, None)
+            # Remove from ticket responses
+            for key in self.response_keys.pop(user_id, ()):
+                responses = ticket_responses.get(key)
+                if responses is not None:
+                    responses.pop(user_id, None)
+                    if not responses:
+                        del ticket_responses[key]
+            # Remove user's tickets
+            for ticket_id in list(self.user_tickets.pop(user_id, ())):
+                self.delete_ticket(ticket_id)
+            # Remove from completed missions
+            for mission_ids in self.user_missions.pop(user_id, {}).values():
+                for mission_id in mission_ids:
+                    if mission_id in archive:
+                        self.drop_mission_completion(archive[mission_id], user_id)
+    
+    def record_response(self, key: str, commander_id: int, message_id: int):
+        """Remember the message a commander received for a ticket or mission"""
+        self.data["command"]["ticket_responses"].setdefault(key, {})[commander_id] = {
+            "message_id": message_id,
+            "chat_id": commander_id
+        }
+        self.response_keys[commander_id].add(key)
+    
+    def moderator_ticket(self, moderator_id: int) -> Optional[dict]:
+        """Oldest ticket the moderator is currently handling"""
+        ticket_ids = self.moderator_tickets.get(moderator_id)
+        if not ticket_ids:
+            return None
+        tickets = self.data["command"]["tickets"]
+        return min((tickets[ticket_id] for ticket_id in ticket_ids), key=itemgetter("created_at_ts"))
+    
+    def open_ticket_count(self) -> int:
+        """Number of tickets that are not closed"""
+        return len(self.data["command"]["tickets"]) - self.ticket_counts[TicketStatus.CLOSED]
     
-    def _create_backup(self, data: dict):
-        """Create data backup"""
+    async def save_data(self) -> bool:
+        """Save data with error handling"""
+        async with self._save_lock:
+            try:
+                # Encode on the loop so handlers can't mutate data mid-snapshot
+                payload = self._encode()
+                covered_generation = self._start_wal_generation()
+                await asyncio.to_thread(self._write_snapshot, payload, covered_generation)
+                # The backup may still be loaded, keep the changes it is missing
+                self._drop_wal(self._backup_generation)
+                logger.info("Data saved successfully")
+                return True
+            except Exception as e:
+                logger.error(f"Save error: {e}")
+                return False
+    
+    def mark_dirty(self):
+        """Request a save; bursts of changes are coalesced into one write"""
+        self._dirty.set()
+    
+    def log_op(self, op: str, *args):
+        """Append a small change to the write-ahead log instead of a full save"""
         try:
-            with open(Config.BACKUP_FILE, "w", encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            if self._wal is None:
+                self._wal = open(self._wal_path(self._wal_generation), "ab")
+            self._wal.write(pack_frame(msgspec.msgpack.encode({"op": op, "args": args})))
+            self._wal.flush()
         except Exception as e:
-            logger.error(f"Backup creation error: {e}")
+            logger.error(f"WAL write error: {e}")
+            self.mark_dirty()
+    
+    def _apply_op(self, op: str, args: list):
+        """Apply a change recorded with log_op"""
+        if op == "username":
+            user_id, username = args
+            self.data["usernames"][user_id] = username
+        elif op == "call_sign":
+            user_id, call_sign = args
+            self.data["command"]["call_signs"][user_id] = call_sign
+        elif op == "unit_add":
+            self.add_to_unit(*args)
+        elif op == "unit_remove":
+            self.remove_from_unit(*args)
+        elif op == "subscribe":
+            self.data["subscribers"].add(args[0])
+        elif op == "combat_ready":
+            self.data["combat_ready"].add(args[0])
+        elif op == "remove_users":
+            self.remove_users(args[0])
+        else:
+            logger.warning(f"Unknown WAL operation: {op}")
+    
+    @staticmethod
+    def _wal_path(generation: int) -> str:
+        return f"{Config.WAL_FILE}.{generation}"
+    
+    @staticmethod
+    def _wal_generations() -> List[int]:
+        """Generations of write-ahead log files present on disk"""
+        generations = []
+        for path in glob.glob(f"{glob.escape(Config.WAL_FILE)}.*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+        return sorted(generations)
+    
+    def _replay_wal(self):
+        """Re-apply logged changes newer than the loaded snapshot"""
+        covered_generation = self._wal_generation
+        generations = self._wal_generations()
+        replayed = 0
+        for generation in generations:
+            if generation <= covered_generation:
+                continue
+            try:
+                with open(self._wal_path(generation), "rb") as f:
+                    for payload in iter_frames(f.read()):
+                        entry = msgspec.msgpack.decode(payload)
+                        self._apply_op(entry["op"], entry["args"])
+                        replayed += 1
+            except Exception as e:
+                logger.error(f"WAL replay error in generation {generation}: {e}")
+        # Never append to a generation that may already be on disk
+        self._wal_generation = max([covered_generation, *generations]) + 1
+        if replayed:
+            logger.info(f"Replayed {replayed} logged changes")
+            self.mark_dirty()
+    
+    def _start_wal_generation(self) -> int:
+        """Switch logging to a new generation, returning the one a snapshot covers"""
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        covered_generation = self._wal_generation
+        self._wal_generation += 1
+        return covered_generation
+    
+    def _drop_wal(self, covered_generation: int):
+        """Remove log generations already contained in the backup snapshot"""
+        for generation in self._wal_generations():
+            if generation <= covered_generation:
+                try:
+                    os.remove(self._wal_path(generation))
+                except OSError as e:
+                    logger.error(f"WAL cleanup error: {e}")
+    
+    async def flush_loop(self):
+        """Background task writing pending changes after a short debounce"""
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(Config.SAVE_DEBOUNCE)
+            self._dirty.clear()
+            await self.save_data()
+    
+    def _encode(self) -> bytes:
+        """Serialize current state into a snapshot frame"""
+        return pack_frame(snapshot_encoder.encode({**self.data, "wal_generation": self._wal_generation}))
+    
+    def _write_snapshot(self, payload: bytes, generation: int):
+        """Atomically replace the data file; every Nth save keeps the previous one as backup"""
+        tmp_path = Config.DATA_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # Generation -1 means the data file wasn't loaded, it may be the corrupt one
+        rotate = self._save_count % Config.BACKUP_EVERY == 0 and self._snapshot_generation != -1
+        if rotate and os.path.exists(Config.DATA_FILE):
+            os.replace(Config.DATA_FILE, Config.BACKUP_FILE)
+            self._backup_generation = self._snapshot_generation
+        os.replace(tmp_path, Config.DATA_FILE)
+        fsync_dir(Config.DATA_FILE)
+        self._snapshot_generation = generation
+        self._save_count += 1
 
 # Initialize data manager
 data_manager = DataManager()
@@ -267,6 +832,11 @@ def create_command_keyboard() -> ReplyKeyboardMarkup:
     )
     return builder.as_markup(resize_keyboard=True)
 
+# Static keyboards are built once and shared by every reply
+UNIT_KEYBOARD = create_unit_keyboard()
+COMMAND_KEYBOARD = create_command_keyboard()
+
+@functools.lru_cache(maxsize=4096)
 def create_ticket_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
     """Keyboard for ticket processing"""
     builder = InlineKeyboardBuilder()
@@ -276,6 +846,7 @@ def create_ticket_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
     ))
     return builder.as_markup()
 
+@functools.lru_cache(maxsize=4096)
 def create_response_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
     """Keyboard for ticket response"""
     builder = InlineKeyboardBuilder()
@@ -290,6 +861,7 @@ def create_response_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
     builder.adjust(2)
     return builder.as_markup()
 
+@functools.lru_cache(maxsize=4096)
 def create_approval_keyboard(mission_id: str) -> InlineKeyboardMarkup:
     """Keyboard for mission approval"""
     builder = InlineKeyboardBuilder()
@@ -298,17 +870,42 @@ def create_approval_keyboard(mission_id: str) -> InlineKeyboardMarkup:
     builder.adjust(2)
     return builder.as_markup()
 
+# --- MESSAGE DELIVERY ---
+# Rate limits are applied by RateLimitMiddleware, this only bounds pending requests
+send_semaphore = asyncio.Semaphore(Config.SEND_CONCURRENCY)
+
+async def fan_out(user_ids: Iterable[int], send: Callable[[int], Awaitable[Any]], what: str) -> Dict[int, Any]:
+    """Run send(user_id) for all users concurrently; returns successful results"""
+    blocked: List[int] = []
+    async def send_one(user_id: int):
+        async with send_semaphore:
+            try:
+                return await send(user_id)
+            except TelegramForbiddenError:
+                blocked.append(user_id)
+            except Exception as e:
+                logger.error(f"Error sending {what} to {user_id}: {e}")
+    # Snapshot the ids, the source sets may change while sending
+    user_ids = list(user_ids)
+    results = await asyncio.gather(*(send_one(user_id) for user_id in user_ids), return_exceptions=True)
+    if blocked:
+        logger.warning(f"Users {blocked} blocked the bot. Removing from database.")
+        remove_users_from_database(blocked)
+    return {
+        user_id: result for user_id, result in zip(user_ids, results)
+        if result is not None and not isinstance(result, BaseException)
+    }
+
 # --- MAIN COMMANDS ---
 @main_router.message(CommandStart())
 async def handle_start(message: Message):
     """Handler for /start command"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     # Update username in cache
     if message.from_user.username:
-        data_manager.data["usernames"][str(user_id)] = message.from_user.username
-        data_manager.save_data()
+        data_manager.set_username(user_id, message.from_user.username)
     
     if is_commander(user_id):
         await message.answer(
@@ -319,101 +916,97 @@ async def handle_start(message: Message):
             "- Monitor mission execution\n"
             "- Assign commanders\n"
             "<i>For the cause!</i>",
-            reply_markup=create_command_keyboard()
+            reply_markup=COMMAND_KEYBOARD
         )
     else:
         if user_id not in data_manager.data["subscribers"]:
             data_manager.data["subscribers"].add(user_id)
-            data_manager.data["units"][UnitType.PRIVATES].add(user_id)
-            data_manager.save_data()
+            data_manager.add_to_unit(user_id, UnitType.PRIVATES)
+            data_manager.log_op("subscribe", user_id)
+            data_manager.log_op("unit_add", user_id, UnitType.PRIVATES)
             await message.answer(
                 "<b>🎖️ Welcome to the CyberGuard!</b>\n"
                 "You've been assigned to the unit.\n"
                 "Click 'Ready for Action!' to receive missions\n"
                 "<i>Unity is strength!</i>",
-                reply_markup=create_unit_keyboard()
+                reply_markup=UNIT_KEYBOARD
             )
         else:
             if user_id in data_manager.data["combat_ready"]:
                 await message.answer(
                     "ℹ️ <b>You are already active!</b>\n"
                     "Await mission directives.",
-                    reply_markup=create_unit_keyboard()
+                    reply_markup=UNIT_KEYBOARD
                 )
             else:
                 await message.answer(
                     "Welcome back! Click 'Ready for Action!' to confirm your status\n"
                     "<i>Together we are unstoppable!</i>",
-                    reply_markup=create_unit_keyboard()
+                    reply_markup=UNIT_KEYBOARD
                 )
 
 # --- USER INFORMATION RETRIEVAL ---
 async def update_username_cache(user_id: int, username: Optional[str] = None):
     """Update username cache"""
     if username:
-        data_manager.data["usernames"][str(user_id)] = username
-        data_manager.save_data()
-    elif str(user_id) in data_manager.data["usernames"]:
-        return data_manager.data["usernames"][str(user_id)]
+        data_manager.set_username(user_id, username)
+    elif user_id in data_manager.data["usernames"]:
+        return data_manager.data["usernames"][user_id]
     else:
         # No attempts to get username through profile_photos
-        data_manager.data["usernames"][str(user_id)] = None
-        data_manager.save_data()
-    return username or data_manager.data["usernames"].get(str(user_id), f"ID: {user_id}")
+        data_manager.set_username(user_id, None)
+    return username or data_manager.data["usernames"].get(user_id, f"ID: {user_id}")
 
 def get_username_display(user_id: int) -> str:
     """Get user's display name"""
-    username = data_manager.data["usernames"].get(str(user_id))
+    username = data_manager.data["usernames"].get(user_id)
     if username:
         return f"@{username}" if not username.startswith("@") else username
     return f"ID: {user_id}"
 
+@functools.lru_cache(maxsize=1024)
+def format_timestamp(iso_time: str) -> str:
+    """Short display form of a stored ISO timestamp"""
+    return datetime.fromisoformat(iso_time).strftime('%d.%m %H:%M')
+
+MEDAL_THRESHOLDS = [10, 25, 50, 100]  # Completed missions needed for each medal
+MEDALS = ["", "🥉", "🥈", "🥇", "🏅"]
+
 def get_user_medal_and_count(user_id: int) -> str:
     """Returns string with completed mission count and medal"""
-    completed = 0
-    for mission in data_manager.data["missions"]["archive"].values():
-        if mission.get("status") == MissionStatus.COMPLETED and user_id in mission.get("completed_by", set()):
-            completed += 1
-    if completed >= 100:
-        medal = "🏅"
-    elif completed >= 50:
-        medal = "🥇"
-    elif completed >= 25:
-        medal = "🥈"
-    elif completed >= 10:
-        medal = "🥉"
-    else:
-        medal = ""
-    return f"{medal} {completed}" if completed > 0 else "0"
+    user_missions = data_manager.user_missions.get(user_id)
+    completed = len(user_missions["completed"]) if user_missions else 0
+    if not completed:
+        return "0"
+    return f"{MEDALS[bisect_right(MEDAL_THRESHOLDS, completed)]} {completed}"
 
 # --- MY STATUS ---
 @main_router.message(F.text == ButtonText.MY_STATUS)
 async def handle_my_status(message: Message):
     """Handler for 'My Status' command"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     username = await update_username_cache(user_id, message.from_user.username)
     display_name = get_username_display(user_id)
     is_ready = user_id in data_manager.data["combat_ready"]
     call_sign = data_manager.data["command"]["call_signs"].get(user_id, "Not set")
-    # Active and completed missions
-    active_missions = []
-    finished_missions = []
-    for mission_id in data_manager.data["missions"]["archive"]:
-        mission = data_manager.data["missions"]["archive"][mission_id]
-        if user_id in mission.get("completed_by", set()):
-            if mission.get("status") == MissionStatus.ACTIVE:
-                active_missions.append(mission)
-            elif mission.get("status") == MissionStatus.COMPLETED:
-                finished_missions.append(mission)
+    # Active and completed missions, straight from the per-user index
+    archive = data_manager.data["missions"]["archive"]
+    user_missions = data_manager.user_missions.get(user_id, {"active": (), "completed": ()})
+    active_missions = sorted(
+        (archive[mid] for mid in user_missions["active"]), key=lambda m: m.get("created_at", "")
+    )
+    finished_missions = sorted(
+        (archive[mid] for mid in user_missions["completed"]), key=lambda m: m.get("created_at", "")
+    )
     # Check active tickets
     active_ticket_info = ""
     if user_id in data_manager.data["command"]["user_active_tickets"]:
         ticket_id = data_manager.data["command"]["user_active_tickets"][user_id]
         ticket = data_manager.data["command"]["tickets"].get(ticket_id, {})
-        if ticket.get("status") != "closed":
-            active_ticket_info = f"Active ticket: {ticket_id} ({ticket.get('status', 'open')})\n"
-    status_text = (
+        if ticket.get("status") != TicketStatus.CLOSED:
+            active_ticket_info = f"Active ticket: {ticket_id} ({ticket.get('status', TicketStatus.OPEN).label})\n"
+    parts = [
         f"👤 <b>Your Status:</b>\n"
         f"Name: {display_name}\n"
         f"Callsign: {call_sign}\n"
@@ -421,30 +1014,28 @@ async def handle_my_status(message: Message):
         f"{active_ticket_info}"
         f"Active missions: {len(active_missions)}\n"
         f"Completed missions: {len(finished_missions)}\n"
-    )
+    ]
     # Keyboard for mission completion (commanders only)
     builder = InlineKeyboardBuilder()
     if active_missions:
-        status_text += "\n<b>Active Missions:</b>\n"
+        parts.append("\n<b>Active Missions:</b>\n")
         for m in active_missions:
-            status_text += f"- {m.get('name', m['id'])} (ID: {m['id']})\n"
+            parts.append(f"- {m.get('name', m['id'])} (ID: {m['id']})\n")
             # Complete button for commanders only
             if is_commander(user_id):
                 builder.button(text=f"Complete: {m.get('name', m['id'])}", callback_data=f"finish_mission:{m['id']}")
     if finished_missions:
-        status_text += "\n<b>Completed Missions:</b>\n"
+        parts.append("\n<b>Completed Missions:</b>\n")
         for m in finished_missions:
-            status_text += f"- {m.get('name', m['id'])} (ID: {m['id']})\n"
-    await message.answer(status_text, reply_markup=builder.as_markup() if builder.buttons else None)
+            parts.append(f"- {m.get('name', m['id'])} (ID: {m['id']})\n")
+    await message.answer("".join(parts), reply_markup=builder.as_markup() if builder.buttons else None)
 
 # --- HELP ---
 @main_router.message(F.text == ButtonText.HELP)
 async def handle_help(message: Message):
     """Handler for /help command"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
-    is_admin = is_commander(user_id)
-    is_centurion = user_id in data_manager.data["units"][UnitType.CENTURIONS]
+    data_manager.touch_activity(user_id)
     help_text = (
         "<b>📚 Command Reference:</b>\n"
         "<b>For All Members:</b>\n"
@@ -453,7 +1044,7 @@ async def handle_help(message: Message):
         "• 'My Status' – View your status and active missions\n"
         "• /help – This guide\n"
     )
-    if is_admin or is_centurion:
+    if is_commander(user_id):
         help_text += (
             "<b>For Command:</b>\n"
             "• 'Create Mission' – Create a new mission\n"
@@ -466,27 +1057,20 @@ async def handle_help(message: Message):
 
 # --- SET CALLSIGN ---
 @main_router.message(F.text == ButtonText.SET_CALL_SIGN)
-async def handle_set_call_sign(message: Message):
+async def handle_set_call_sign(message: Message, state: FSMContext):
     """Handler for setting callsign"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     # Set state to await new callsign
-    data_manager.data["command"]["temp_actions"][user_id] = {
-        "action": "set_call_sign",
-        "step": "awaiting_input"
-    }
+    await state.set_state(ActionStates.awaiting_callsign)
     await message.answer(
         "📝 <b>Enter new callsign (max 20 characters):</b>\n"
         "This will be used for identification in the system and visible to other members."
     )
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_actions"] and
-    data_manager.data["command"]["temp_actions"][m.from_user.id].get("action") == "set_call_sign" and
-    data_manager.data["command"]["temp_actions"][m.from_user.id].get("step") == "awaiting_input"
-)
-async def handle_call_sign_input(message: Message):
+@main_router.message(ActionStates.awaiting_callsign)
+async def handle_call_sign_input(message: Message, state: FSMContext):
     """Process callsign input"""
     user_id = message.from_user.id
     new_call_sign = message.text.strip()
@@ -495,13 +1079,13 @@ async def handle_call_sign_input(message: Message):
         return
     
     data_manager.data["command"]["call_signs"][user_id] = new_call_sign
-    data_manager.save_data()
+    data_manager.log_op("call_sign", user_id, new_call_sign)
     
     await message.answer(
         f"✅ <b>Callsign successfully updated!</b>\n"
         f"New callsign: {new_call_sign}"
     )
-    del data_manager.data["command"]["temp_actions"][user_id]
+    await state.clear()
 
 # --- UNIT MANAGEMENT ---
 @main_router.message(F.text == ButtonText.MANAGE_UNITS)
@@ -512,7 +1096,7 @@ async def handle_manage_units(message: Message):
         await message.answer("❌ Insufficient permissions!")
         return
     
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     # Create unit management keyboard
     builder = InlineKeyboardBuilder()
@@ -538,7 +1122,7 @@ async def handle_unit_management(callback: CallbackQuery):
         await callback.answer("❌ Insufficient permissions!")
         return
     
-    data_manager.data["command"]["activity"][commander_id] = datetime.now()
+    data_manager.touch_activity(commander_id)
     
     # Create action keyboard
     builder = InlineKeyboardBuilder()
@@ -558,14 +1142,14 @@ async def handle_unit_management(callback: CallbackQuery):
     F.data.startswith("remove_from_") |
     F.data.startswith("list_")
 )
-async def handle_unit_actions(callback: CallbackQuery):
+async def handle_unit_actions(callback: CallbackQuery, state: FSMContext):
     """Handler for unit actions (with pagination)"""
     action = callback.data
     commander_id = callback.from_user.id
     if not is_commander(commander_id):
         await callback.answer("❌ Insufficient permissions!")
         return
-    data_manager.data["command"]["activity"][commander_id] = datetime.now()
+    data_manager.touch_activity(commander_id)
     # --- Member list pagination ---
     if action.startswith("list_"):
         # Support for list_{unit_type}_page_{n}
@@ -577,8 +1161,7 @@ async def handle_unit_actions(callback: CallbackQuery):
                 page = int(parts[3])
             except Exception:
                 page = 0
-        members = list(data_manager.data["units"].get(unit_type, set()))
-        members.sort()
+        members = data_manager.sorted_unit_members(unit_type)
         PAGE_SIZE = 10
         total = len(members)
         if not members:
@@ -589,8 +1172,8 @@ async def handle_unit_actions(callback: CallbackQuery):
         page_members = members[start:end]
         # Get usernames and medals (foundation for future system)
         members_list = []
+        data_manager.touch_usernames(page_members)
         for member_id in page_members:
-            await update_username_cache(member_id)
             medal_str = get_user_medal_and_count(member_id)
             members_list.append(f"- {get_username_display(member_id)} (ID: {member_id}) — {medal_str}")
         member_list = "\n".join(members_list)
@@ -613,10 +1196,8 @@ async def handle_unit_actions(callback: CallbackQuery):
     # --- Add/Remove member ---
     elif action.startswith("add_to_") or action.startswith("remove_from_"):
         unit_type = action.split("_")[2]
-        data_manager.data["command"]["temp_actions"][commander_id] = {
-            "action": action,
-            "step": "awaiting_input"
-        }
+        await state.set_state(ActionStates.awaiting_userid)
+        await state.update_data(action=action)
         await callback.message.edit_text(
             f"🆔 <b>{'Adding' if 'add' in action else 'Removing'} member from {unit_type.capitalize()}</b>\n"
             "Enter user ID:",
@@ -624,14 +1205,10 @@ async def handle_unit_actions(callback: CallbackQuery):
         )
         await callback.answer()
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_actions"] and
-    re.match(r"add_to_|remove_from_", data_manager.data["command"]["temp_actions"][m.from_user.id].get("action", ""))
-)
-async def handle_user_id_input(message: Message):
+@main_router.message(ActionStates.awaiting_userid)
+async def handle_user_id_input(message: Message, state: FSMContext):
     """Process user ID input for unit management"""
-    commander_id = message.from_user.id
-    action = data_manager.data["command"]["temp_actions"][commander_id]["action"]
+    action = (await state.get_data())["action"]
     user_id_str = message.text.strip()
     
     try:
@@ -644,22 +1221,23 @@ async def handle_user_id_input(message: Message):
     is_add = "add" in action
     
     if is_add:
-        data_manager.data["units"][unit_type].add(target_user_id)
+        data_manager.add_to_unit(target_user_id, unit_type)
+        data_manager.log_op("unit_add", target_user_id, unit_type)
         await message.answer(
             f"✅ User {target_user_id} added to {unit_type.capitalize()} unit."
         )
     else:
-        if target_user_id not in data_manager.data["units"][unit_type]:
+        if not data_manager.is_in_unit(target_user_id, unit_type):
             await message.answer("❌ User is not in this unit.")
             return
         
-        data_manager.data["units"][unit_type].remove(target_user_id)
+        data_manager.remove_from_unit(target_user_id, unit_type)
+        data_manager.log_op("unit_remove", target_user_id, unit_type)
         await message.answer(
             f"✅ User {target_user_id} removed from {unit_type.capitalize()} unit."
         )
     
-    data_manager.save_data()
-    del data_manager.data["command"]["temp_actions"][commander_id]
+    await state.clear()
 
 # --- ACTIVE TICKETS ---
 @main_router.message(F.text == ButtonText.ACTIVE_TICKETS)
@@ -670,30 +1248,30 @@ async def handle_active_tickets(message: Message):
         await message.answer("❌ Insufficient permissions!")
         return
     
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     active_tickets = [
         t for t in data_manager.data["command"]["tickets"].values()
-        if t["status"] != "closed"
+        if t["status"] != TicketStatus.CLOSED
     ]
     
     if not active_tickets:
         await message.answer("ℹ️ No active tickets.")
         return
     
-    response = "📋 <b>Active Tickets:</b>\n"
+    parts = ["📋 <b>Active Tickets:</b>\n"]
     for ticket in active_tickets:
-        response += (
+        parts.append(
             f"ID: {ticket['id']}\n"
             f"From: {get_username_display(ticket['user_id'])} (ID: {ticket['user_id']})\n"
-            f"Status: {ticket['status']}\n"
-            f"Created: {datetime.fromisoformat(ticket['created_at']).strftime('%d.%m %H:%M')}\n"
+            f"Status: {ticket['status'].label}\n"
+            f"Created: {format_timestamp(ticket['created_at'])}\n"
             f"{'-'*20}\n"
         )
     
     # Add commands for viewing specific tickets
-    response += "\nTo view a specific ticket, use command: /ticket_123456789"
-    await message.answer(response)
+    parts.append("\nTo view a specific ticket, use command: /ticket_123456789")
+    await message.answer("".join(parts))
 
 # --- БОЕВАЯ СВОДКА ---
 @main_router.message(F.text == ButtonText.STATS)
@@ -703,17 +1281,11 @@ async def handle_stats(message: Message):
     if not is_commander(user_id):
         await message.answer("❌ Insufficient permissions!")
         return
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
-    # Mission statistics
-    mission_counts = {
-        status: 0 for status in MissionStatus.__dict__.values()
-    }
-    for mission in data_manager.data["missions"]["archive"].values():
-        mission_counts[mission["status"]] += 1
-    # Ticket statistics
-    open_tickets = sum(1 for t in data_manager.data["command"]["tickets"].values() if t["status"] == "open")
-    in_progress_tickets = sum(1 for t in data_manager.data["command"]["tickets"].values() if t["status"] == "in_progress")
-    response = (
+    data_manager.touch_activity(user_id)
+    # Counters are maintained incrementally by DataManager
+    mission_counts = data_manager.mission_counts
+    ticket_counts = data_manager.ticket_counts
+    parts = [
         "📊 <b>Operations Summary</b>\n"
         "<u>Missions:</u>\n"
         f"- Active: {mission_counts[MissionStatus.ACTIVE]}\n"
@@ -721,30 +1293,26 @@ async def handle_stats(message: Message):
         f"- Pending: {mission_counts[MissionStatus.PENDING]}\n"
         f"- Rejected: {mission_counts[MissionStatus.REJECTED]}\n"
         "<u>Tickets:</u>\n"
-        f"- Waiting: {open_tickets}\n"
-        f"- In Progress: {in_progress_tickets}\n"
+        f"- Waiting: {ticket_counts[TicketStatus.OPEN]}\n"
+        f"- In Progress: {ticket_counts[TicketStatus.IN_PROGRESS]}\n"
         "<u>Units:</u>\n"
         f"- {UnitType.CENTURIONS.capitalize()}: {len(data_manager.data['units'][UnitType.CENTURIONS])}\n"
         f"- {UnitType.DECURIONS.capitalize()}: {len(data_manager.data['units'][UnitType.DECURIONS])}\n"
         f"- {UnitType.PRIVATES.capitalize()}: {len(data_manager.data['units'][UnitType.PRIVATES])}\n"
         "\n<b>Active Missions:</b>"
-    )
+    ]
     # Add list of active missions with names and completion buttons
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
     builder = InlineKeyboardBuilder()
-    active_missions = []
     for mission_id in data_manager.data["missions"]["active"]:
         mission = data_manager.data["missions"]["archive"].get(mission_id, {})
         mission_name = mission.get("name", mission_id)
-        status = mission.get('status', 'unknown')
-        active_missions.append(f"- {mission_name} ({status})")
+        status = mission.get('status')
+        parts.append(f"- {mission_name} ({status.label if status is not None else 'unknown'})")
         if status == MissionStatus.ACTIVE:
             builder.button(text=f"Complete: {mission_name}", callback_data=f"finish_mission:{mission_id}")
-    if active_missions:
-        response += "\n" + "\n".join(active_missions)
-    else:
-        response += "\nNo active missions"
-    await message.answer(response, reply_markup=builder.as_markup() if builder.buttons else None)
+    if len(parts) == 1:
+        parts.append("No active missions")
+    await message.answer("\n".join(parts), reply_markup=builder.as_markup() if builder.buttons else None)
 
 # --- TICKET SYSTEM ---
 @main_router.message(Command(commands=["ticket"]))
@@ -755,11 +1323,11 @@ async def handle_ticket_command(message: Message, command: Command):
         return
     
     ticket_id = command.args.strip()
-    if ticket_id not in data_manager.data["command"]["tickets"]:
+    ticket = data_manager.data["command"]["tickets"].get(ticket_id)
+    if ticket is None:
         await message.answer("❌ Ticket not found!")
         return
     
-    ticket = data_manager.data["command"]["tickets"][ticket_id]
     user_id = message.from_user.id
     
     # Check if user has permission to view the ticket
@@ -770,44 +1338,46 @@ async def handle_ticket_command(message: Message, command: Command):
     # Get user information
     display_name = get_username_display(ticket["user_id"])
     
-    details = (
+    parts = [
         f"📋 <b>Ticket Details {ticket_id}</b>\n"
         f"From: {display_name} (ID: {ticket['user_id']})\n"
-        f"Status: {ticket['status']}\n"
-        f"Created: {datetime.fromisoformat(ticket['created_at']).strftime('%d.%m %H:%M')}\n"
-        f"\n<b>Ticket History:</b>\n"
-    )
+        f"Status: {ticket['status'].label}\n"
+        f"Created: {format_timestamp(ticket['created_at'])}\n"
+        f"\n<b>Ticket History:</b>"
+    ]
     # Collect all messages and responses in chronological order
     history = []
+    created_ts = ticket.get("created_at_ts", 0.0)
     for msg in ticket.get("messages", []):
-        history.append({
-            "type": "user",
-            "text": msg if isinstance(msg, str) else msg.get("text", str(msg)),
-            "time": ticket.get("created_at"),
-        })
+        # The initial report is a plain string stamped with the ticket creation time
+        if isinstance(msg, str):
+            history.append({"type": "user", "text": msg, "time_ts": created_ts})
+        else:
+            history.append({
+                "type": "user",
+                "text": msg.get("text", str(msg)),
+                "time_ts": msg.get("time_ts", created_ts),
+            })
     for resp in ticket.get("responses", []):
         history.append({
             "type": "commander",
             "text": resp["text"],
-            "time": resp.get("timestamp"),
-            "commander_id": resp.get("commander_id"),
+            "time_ts": resp.get("time_ts", 0.0),
+            # Responses are stored with moderator_id, very old ones with commander_id
+            "commander_id": resp.get("moderator_id", resp.get("commander_id")),
         })
-    # Сортируем по времени (если есть timestamp)
-    def get_time(x):
-        try:
-            return datetime.fromisoformat(x["time"]) if x["time"] else datetime.min
-        except Exception:
-            return datetime.min
-    history.sort(key=get_time)
+    history.sort(key=itemgetter("time_ts"))
     if not history:
-        details += "No messages in this ticket.\n"
+        parts.append("No messages in this ticket.")
     else:
+        call_signs = data_manager.data["command"]["call_signs"]
         for h in history:
             if h["type"] == "user":
-                details += f"👤 User: {h['text']}\n"
+                parts.append(f"👤 User: {h['text']}")
             else:
-                call_sign = data_manager.data["command"]["call_signs"].get(h.get("commander_id"), f"Commander-{h.get('commander_id')}")
-                details += f"🛡️ {call_sign}: {h['text']}\n"
+                commander_id = h.get("commander_id")
+                parts.append(f"🛡️ {call_signs.get(commander_id, f'Commander-{commander_id}')}: {h['text']}")
+    details = "\n".join(parts) + "\n"
     # Add keyboard if user is a commander
     if is_commander(user_id):
         keyboard = create_response_keyboard(ticket_id)
@@ -816,6 +1386,19 @@ async def handle_ticket_command(message: Message, command: Command):
         await message.answer(details)
 
 # --- MISSION SYSTEM ---
+def mission_targets(mission_type: str) -> List[str]:
+    """Units that receive missions of the given type"""
+    if mission_type == "all":
+        return UnitType.ALL_TYPES
+    elif mission_type == "decurions":
+        return [UnitType.DECURIONS, UnitType.CENTURIONS]
+    else:  # privates
+        return [UnitType.PRIVATES]
+
+def count_targets(targets: list) -> int:
+    """Number of members in the target units"""
+    return sum(len(data_manager.data["units"][t]) for t in targets)
+
 async def distribute_mission(mission: dict, targets: list):
     """Distribute mission to units"""
     mission_id = mission["id"]
@@ -827,20 +1410,17 @@ async def distribute_mission(mission: dict, targets: list):
     content = mission.get('content', '')
     parse_mode = "MarkdownV2"
     # Message without HTML, without "Mission status" and other extra lines
-    for unit_type in targets:
-        for user_id in data_manager.data["units"][unit_type]:
-            try:
-                await bot.send_message(
-                    user_id,
-                    f"⚡ *Mission: {mission_name}*\n{content}",
-                    reply_markup=builder.as_markup(),
-                    parse_mode=parse_mode
-                )
-            except TelegramForbiddenError:
-                logger.warning(f"User {user_id} blocked the bot. Removing from database.")
-                remove_user_from_database(user_id)
-            except Exception as e:
-                logger.error(f"Error sending mission to {user_id}: {e}")
+    text = f"⚡ *Mission: {mission_name}*\n{content}"
+    markup = builder.as_markup()
+    units = data_manager.data["units"]
+    delivered = await fan_out(
+        {user_id for unit_type in targets for user_id in units[unit_type]},
+        lambda user_id: bot.send_message(user_id, text, reply_markup=markup, parse_mode=parse_mode),
+        "mission"
+    )
+    # Only users who received the mission can complete it, later joins don't count
+    mission["recipients"] = set(delivered)
+    mission["total_targets"] = len(delivered)
 
 # --- CREATE MISSION WITH NAME ---
 @main_router.message(F.text == ButtonText.CREATE_MISSION)
@@ -849,19 +1429,18 @@ async def handle_create_mission(message: Message):
     user_id = message.from_user.id
     # Decurions can only create missions for privates
     is_admin = is_commander(user_id)
-    is_centurion = user_id in data_manager.data["units"][UnitType.CENTURIONS]
-    is_decurion = user_id in data_manager.data["units"][UnitType.DECURIONS]
-    if not (is_admin or is_centurion or is_decurion):
+    is_decurion = data_manager.is_in_unit(user_id, UnitType.DECURIONS)
+    if not (is_admin or is_decurion):
         await message.answer("❌ Insufficient permissions!")
         return
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     # Create mission type selection keyboard
     builder = InlineKeyboardBuilder()
-    if is_admin or is_centurion:
+    if is_admin:
         builder.button(text="For All Units", callback_data="mission_type:all")
         builder.button(text="For Decurions Only", callback_data="mission_type:decurions")
     # Decurions and above can create for privates
-    if is_admin or is_centurion or is_decurion:
+    if is_admin or is_decurion:
         builder.button(text="For Privates Only", callback_data="mission_type:privates")
     builder.adjust(1)
     await message.answer(
@@ -871,16 +1450,13 @@ async def handle_create_mission(message: Message):
     )
 
 @main_router.callback_query(F.data.startswith("mission_type:"))
-async def handle_mission_type(callback: CallbackQuery):
+async def handle_mission_type(callback: CallbackQuery, state: FSMContext):
     """Handle mission type selection"""
     mission_type = callback.data.split(":")[1]
-    user_id = callback.from_user.id
     
     # Save temporary data
-    data_manager.data["command"]["temp_missions"][user_id] = {
-        "type": mission_type,
-        "step": "awaiting_name"
-    }
+    await state.set_state(MissionFSM.awaiting_name)
+    await state.update_data(type=mission_type)
     
     await callback.message.edit_text(
         f"⚡ <b>Create New Mission</b>\n"
@@ -889,15 +1465,9 @@ async def handle_mission_type(callback: CallbackQuery):
     )
     await callback.answer()
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_missions"] and
-    data_manager.data["command"]["temp_missions"][m.from_user.id]["step"] == "awaiting_name"
-)
-async def handle_mission_name(message: Message):
+@main_router.message(MissionFSM.awaiting_name)
+async def handle_mission_name(message: Message, state: FSMContext):
     """Process mission name input"""
-    user_id = message.from_user.id
-    mission_data = data_manager.data["command"]["temp_missions"][user_id]
-    mission_type = mission_data["type"]
     mission_name = message.text.strip()
     
     if len(mission_name) > Config.MAX_MISSION_NAME_LENGTH:
@@ -905,8 +1475,8 @@ async def handle_mission_name(message: Message):
         return
     
     # Update step
-    data_manager.data["command"]["temp_missions"][user_id]["step"] = "awaiting_content"
-    data_manager.data["command"]["temp_missions"][user_id]["name"] = mission_name
+    await state.set_state(MissionFSM.awaiting_content)
+    await state.update_data(name=mission_name)
     
     await message.answer(
         f"⚡ <b>Create New Mission</b>\n"
@@ -914,38 +1484,33 @@ async def handle_mission_name(message: Message):
         "Enter mission content:"
     )
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_missions"] and
-    data_manager.data["command"]["temp_missions"][m.from_user.id]["step"] == "awaiting_content"
-)
-async def handle_mission_content(message: Message):
+@main_router.message(MissionFSM.awaiting_content)
+async def handle_mission_content(message: Message, state: FSMContext):
     """Process mission content"""
     user_id = message.from_user.id
-    mission_data = data_manager.data["command"]["temp_missions"][user_id]
+    mission_data = await state.get_data()
     mission_type = mission_data["type"]
     mission_content = message.text
     mission_name = mission_data.get("name", "Untitled")
     is_admin = is_commander(user_id)
-    is_centurion = int(user_id) in set(int(x) for x in data_manager.data["units"][UnitType.CENTURIONS])
-    is_decurion = int(user_id) in set(int(x) for x in data_manager.data["units"][UnitType.DECURIONS])
+    is_centurion = data_manager.is_in_unit(user_id, UnitType.CENTURIONS)
+    is_decurion = data_manager.is_in_unit(user_id, UnitType.DECURIONS)
     # Determine target group
     if mission_type == "all":
         if not (is_admin or is_centurion):
             await message.answer("❌ Insufficient permissions to create this type of mission!")
             return
-        targets = UnitType.ALL_TYPES
     elif mission_type == "decurions":
         if not (is_admin or is_centurion):
             await message.answer("❌ Insufficient permissions to create this type of mission!")
             return
-        targets = [UnitType.DECURIONS, UnitType.CENTURIONS]
     else:  # privates
         if not (is_admin or is_centurion or is_decurion):
             await message.answer("❌ Insufficient permissions to create this type of mission!")
             return
-        targets = [UnitType.PRIVATES]
+    targets = mission_targets(mission_type)
     # Create mission
-    mission_id = f"mission_{user_id}_{int(datetime.now().timestamp())}"
+    mission_id = f"mission_{user_id}_{time.time_ns()}"
     mission = {
         "id": mission_id,
         "creator": user_id,
@@ -961,24 +1526,21 @@ async def handle_mission_content(message: Message):
         mission["status"] = MissionStatus.PENDING
         approval_keyboard = create_approval_keyboard(mission_id)
         # Send for approval to centurions
-        for centurion_id in data_manager.data["units"][UnitType.CENTURIONS]:
-            try:
-                msg = await bot.send_message(
-                    centurion_id,
-                    f"🔐 <b>Mission Approval Request</b>\n"
-                    f"Creator: {user_id}\n"
-                    f"Type: For Privates\n"
-                    f"Name: {mission_name}\n"
-                    f"Content:\n{mission_content}",
-                    reply_markup=approval_keyboard
-                )
-                # Save message ID for updates
-                data_manager.data["command"]["ticket_responses"].setdefault(mission_id, {})[centurion_id] = {
-                    "message_id": msg.message_id,
-                    "chat_id": centurion_id
-                }
-            except Exception as e:
-                logger.error(f"Error sending approval request to {centurion_id}: {e}")
+        approval_text = (
+            f"🔐 <b>Mission Approval Request</b>\n"
+            f"Creator: {user_id}\n"
+            f"Type: For Privates\n"
+            f"Name: {mission_name}\n"
+            f"Content:\n{mission_content}"
+        )
+        sent = await fan_out(
+            data_manager.data["units"][UnitType.CENTURIONS],
+            lambda centurion_id: bot.send_message(centurion_id, approval_text, reply_markup=approval_keyboard),
+            "approval request"
+        )
+        for centurion_id, msg in sent.items():
+            # Save message ID for updates
+            data_manager.record_response(mission_id, centurion_id, msg.message_id)
         await message.answer(
             "🕒 <b>Mission sent for command approval</b>\n"
             "You will be notified after review."
@@ -992,10 +1554,9 @@ async def handle_mission_content(message: Message):
             f"Reach: {len(targets)} units"
         )
     # Save mission
-    data_manager.data["missions"]["active"].append(mission_id)
-    data_manager.data["missions"]["archive"][mission_id] = mission
-    del data_manager.data["command"]["temp_missions"][user_id]
-    data_manager.save_data()
+    data_manager.add_mission(mission)
+    await state.clear()
+    data_manager.mark_dirty()
 
 # --- MISSION APPROVAL/REJECTION ---
 @main_router.callback_query(F.data.startswith("approve_mission:"))
@@ -1003,26 +1564,19 @@ async def handle_approve_mission(callback: CallbackQuery):
     """Handle mission approval"""
     mission_id = callback.data.split(":")[1]
     commander_id = callback.from_user.id
-    if mission_id not in data_manager.data["missions"]["archive"]:
+    mission = data_manager.data["missions"]["archive"].get(mission_id)
+    if mission is None:
         await callback.answer("❌ Mission not found!")
         return
-    mission = data_manager.data["missions"]["archive"][mission_id]
     if mission["status"] != MissionStatus.PENDING:
         await callback.answer("❌ Mission already processed!")
         return
     # Update status
-    mission["status"] = MissionStatus.ACTIVE
+    data_manager.set_mission_status(mission, MissionStatus.ACTIVE)
     mission["approved_by"] = commander_id
     mission["approved_at"] = datetime.now().isoformat()
     # Distribute mission
-    mission_type = mission["type"]
-    if mission_type == "all":
-        targets = UnitType.ALL_TYPES
-    elif mission_type == "decurions":
-        targets = [UnitType.DECURIONS, UnitType.CENTURIONS]
-    else:  # privates
-        targets = [UnitType.PRIVATES]
-    await distribute_mission(mission, targets)
+    await distribute_mission(mission, mission_targets(mission["type"]))
     # Notify creator
     creator_id = mission["creator"]
     try:
@@ -1037,7 +1591,7 @@ async def handle_approve_mission(callback: CallbackQuery):
     except Exception as e:
         logger.error(f"Error notifying creator {creator_id}: {e}")
     await callback.answer("✅ Mission approved and launched!")
-    data_manager.save_data()
+    data_manager.mark_dirty()
 
 @main_router.callback_query(F.data.startswith("reject_mission:"))
 async def handle_reject_mission(callback: CallbackQuery):
@@ -1045,18 +1599,17 @@ async def handle_reject_mission(callback: CallbackQuery):
     mission_id = callback.data.split(":")[1]
     commander_id = callback.from_user.id
     
-    if mission_id not in data_manager.data["missions"]["archive"]:
+    mission = data_manager.data["missions"]["archive"].get(mission_id)
+    if mission is None:
         await callback.answer("❌ Mission not found!")
         return
     
-    mission = data_manager.data["missions"]["archive"][mission_id]
-    
     if mission["status"] != MissionStatus.PENDING:
         await callback.answer("❌ Mission already processed!")
         return
     
     # Update status
-    mission["status"] = MissionStatus.REJECTED
+    data_manager.set_mission_status(mission, MissionStatus.REJECTED)
     mission["rejected_by"] = commander_id
     mission["rejected_at"] = datetime.now().isoformat()
     
@@ -1075,85 +1628,76 @@ async def handle_reject_mission(callback: CallbackQuery):
         logger.error(f"Error notifying creator {creator_id}: {e}")
     
     await callback.answer("❌ Mission rejected.")
-    data_manager.save_data()
+    data_manager.mark_dirty()
 
 # --- TICKET SYSTEM ---
 @main_router.message(F.text == ButtonText.REPORT)
-async def handle_report_start(message: Message):
+async def handle_report_start(message: Message, state: FSMContext):
     """Start creating a report"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     # Check for active ticket
     if user_id in data_manager.data["command"]["user_active_tickets"]:
         ticket_id = data_manager.data["command"]["user_active_tickets"][user_id]
         ticket = data_manager.data["command"]["tickets"].get(ticket_id)
-        if ticket and ticket["status"] != "closed":
+        if ticket and ticket["status"] != TicketStatus.CLOSED:
             await message.answer(
                 "ℹ️ <b>You already have an active ticket!</b>\n"
                 f"ID: {ticket_id}\n"
-                f"Status: {ticket.get('status', 'unknown')}\n"
+                f"Status: {ticket['status'].label}\n"
                 "You can continue the conversation in this chat."
             )
             return
     
     # Set state to await ticket text
-    data_manager.data["command"]["temp_actions"][user_id] = {
-        "action": "create_ticket",
-        "step": "awaiting_text"
-    }
+    await state.set_state(TicketFSM.awaiting_text)
     
     await message.answer(
         "📝 <b>Enter your report text:</b>\n"
         "Please describe the issue or question in detail."
     )
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_actions"] and
-    data_manager.data["command"]["temp_actions"][m.from_user.id].get("action") == "create_ticket" and
-    data_manager.data["command"]["temp_actions"][m.from_user.id].get("step") == "awaiting_text"
-)
-async def handle_report_text(message: Message):
+@main_router.message(TicketFSM.awaiting_text)
+async def handle_report_text(message: Message, state: FSMContext):
     """Process report text"""
     user_id = message.from_user.id
     report_text = message.text
     
     # Create ticket
-    ticket_id = f"ticket_{user_id}_{int(datetime.now().timestamp())}"
+    ticket_id = f"ticket_{user_id}_{time.time_ns()}"
+    now = datetime.now()
     ticket = {
         "id": ticket_id,
         "user_id": user_id,
         "text": report_text,
-        "status": "open",
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat(),
+        "status": TicketStatus.OPEN,
+        "created_at": now.isoformat(),
+        "created_at_ts": now.timestamp(),
+        "updated_at": now.isoformat(),
         "assigned_to": None,
         "messages": [report_text],
         "responses": []
     }
     
-    data_manager.data["command"]["tickets"][ticket_id] = ticket
+    data_manager.add_ticket(ticket)
     data_manager.data["command"]["user_active_tickets"][user_id] = ticket_id
     
     # Send to commanders
-    commanders = set(data_manager.data["units"][UnitType.CENTURIONS]) | Config.ADMIN_IDS
-    
-    for commander_id in commanders:
-        try:
-            msg = await bot.send_message(
-                commander_id,
-                f"🚨 <b>New report from member (ID: {user_id}):</b>\n"
-                f"{report_text}\n"
-                f"ID: {ticket_id}",
-                reply_markup=create_ticket_keyboard(ticket_id)
-            )
-            # Save message ID for updates
-            data_manager.data["command"]["ticket_responses"].setdefault(ticket_id, {})[commander_id] = {
-                "message_id": msg.message_id,
-                "chat_id": commander_id
-            }
-        except Exception as e:
-            logger.error(f"Error sending to commander {commander_id}: {e}")
+    report_message = (
+        f"🚨 <b>New report from member (ID: {user_id}):</b>\n"
+        f"{report_text}\n"
+        f"ID: {ticket_id}"
+    )
+    ticket_keyboard = create_ticket_keyboard(ticket_id)
+    sent = await fan_out(
+        data_manager.commanders,
+        lambda commander_id: bot.send_message(commander_id, report_message, reply_markup=ticket_keyboard),
+        "report"
+    )
+    for commander_id, msg in sent.items():
+        # Save message ID for updates
+        data_manager.record_response(ticket_id, commander_id, msg.message_id)
     
     await message.answer(
         "✅ <b>Your report has been registered!</b>\n"
@@ -1163,10 +1707,9 @@ async def handle_report_text(message: Message):
     )
     
     # Очистка временных данных
-    if user_id in data_manager.data["command"]["temp_actions"]:
-        del data_manager.data["command"]["temp_actions"][user_id]
+    await state.clear()
     
-    data_manager.save_data()
+    data_manager.mark_dirty()
 
 # --- ОБРАБОТЧИК ЗАВЕРШЕНИЯ МИССИЙ ---
 @main_router.callback_query(F.data.startswith("complete_mission:"))
@@ -1174,51 +1717,38 @@ async def handle_mission_complete(callback: CallbackQuery):
     """Обработка завершения миссии"""
     mission_id = callback.data.split(":")[1]
     user_id = callback.from_user.id
-    if mission_id not in data_manager.data["missions"]["archive"]:
+    archive = data_manager.data["missions"]["archive"]
+    mission = archive.get(mission_id)
+    if mission is None:
         await callback.answer("❌ Миссия не найдена!")
         return
-    mission = data_manager.data["missions"]["archive"][mission_id]
     if mission["status"] != MissionStatus.ACTIVE:
         await callback.answer("❌ Миссия не активна!")
         return
+    completed_by = mission["completed_by"]
     # Проверка повторного выполнения
-    if user_id in mission.get("completed_by", set()):
+    if user_id in completed_by:
         await callback.answer("ℹ️ Вы уже отметили выполнение этой миссии!")
         return
     # Отметка выполнения
-    if "completed_by" not in mission or not isinstance(mission["completed_by"], set):
-        mission["completed_by"] = set(mission.get("completed_by", []))
-    mission["completed_by"].add(user_id)
-    data_manager.data["missions"]["archive"][mission_id] = mission
+    data_manager.record_mission_completion(mission, user_id)
     # Проверяем, все ли выполнили миссию
-    mission_type = mission["type"]
-    if mission_type == "all":
-        targets = UnitType.ALL_TYPES
-    elif mission_type == "decurions":
-        targets = [UnitType.DECURIONS, UnitType.CENTURIONS]
-    else:  # privates
-        targets = [UnitType.PRIVATES]
-    total_targets = sum(len(data_manager.data["units"][t]) for t in targets)
-    completed_count = len(mission.get("completed_by", set()))
-    if completed_count == total_targets:
+    if "total_targets" not in mission:
+        # Missions activated before the target count was stored
+        mission["total_targets"] = count_targets(mission_targets(mission["type"]))
+    if len(completed_by) >= mission["total_targets"]:
         # All users completed the mission, send notification
         completion_message = (
             f"✅ <b>Mission \"{mission.get('name', mission_id)}\" completed!</b>\n"
             "Thank you for your participation"
         )
-        for completed_user_id in mission.get("completed_by", set()):
-            try:
-                await bot.send_message(
-                    completed_user_id,
-                    completion_message
-                )
-            except TelegramForbiddenError:
-                logger.warning(f"User {completed_user_id} blocked the bot. Removing from database.")
-                remove_user_from_database(completed_user_id)
-            except Exception as e:
-                logger.error(f"Error sending completion notification to {completed_user_id}: {e}")
+        await fan_out(
+            completed_by,
+            lambda completed_user_id: bot.send_message(completed_user_id, completion_message),
+            "completion notification"
+        )
     await callback.answer("✅ Your report has been accepted! Thank you for your participation.")
-    data_manager.save_data()
+    data_manager.mark_dirty()
 
 # --- СИСТЕМА ОБРАЩЕНИЙ ---
 @main_router.callback_query(F.data.startswith("take_ticket:"))
@@ -1234,15 +1764,16 @@ async def handle_take_ticket(callback: CallbackQuery):
         
         ticket = data_manager.data["command"]["tickets"][ticket_id]
         
-        if ticket["status"] != "open":
+        if ticket["status"] != TicketStatus.OPEN:
             await callback.answer("❌ Обращение уже в работе!")
             return
         
         # Обновление статуса
-        ticket["status"] = "in_progress"
         ticket["assigned_to"] = commander_id
-        ticket["assigned_at"] = datetime.now().isoformat()
-        ticket["updated_at"] = datetime.now().isoformat()
+        data_manager.set_ticket_status(ticket, TicketStatus.IN_PROGRESS)
+        now = datetime.now()
+        ticket["assigned_at"] = now.isoformat()
+        data_manager.touch_ticket(ticket, now)
         
         # Получение позывного
         call_sign = data_manager.data["command"]["call_signs"].get(
@@ -1265,21 +1796,18 @@ async def handle_take_ticket(callback: CallbackQuery):
         except Exception as e:
             logger.error(f"Ошибка уведомления бойца {user_id}: {e}")
         
+        # Update ticket_responses record for this supervisor
+        data_manager.record_response(ticket_id, commander_id, callback.message.message_id)
         # Update message for supervisors (current message only)
         try:
             await callback.message.edit_reply_markup(
                 reply_markup=create_response_keyboard(ticket_id)
             )
-            # Update ticket_responses record for this supervisor
-            data_manager.data["command"]["ticket_responses"].setdefault(ticket_id, {})[supervisor_id] = {
-                "message_id": callback.message.message_id,
-                "chat_id": supervisor_id
-            }
         except Exception as e:
             logger.error(f"Error updating message: {e}")
         
         await callback.answer("✅ You have taken the ticket")
-        data_manager.save_data()
+        data_manager.mark_dirty()
     except Exception as e:
         logger.error(f"Error in handle_take_ticket: {e}")
         await callback.answer("❌ An error occurred")
@@ -1290,55 +1818,54 @@ async def handle_close_ticket(callback: CallbackQuery):
     """Close the ticket"""
     ticket_id = callback.data.split(":")[1]
     user_id = callback.from_user.id
+    command_state = data_manager.data["command"]
     
-    if ticket_id not in data_manager.data["command"]["tickets"]:
+    ticket = command_state["tickets"].get(ticket_id)
+    if ticket is None:
         await callback.answer("❌ Ticket not found!")
         return
     
-    ticket = data_manager.data["command"]["tickets"][ticket_id]
-    
     # Check closure permissions
     if not is_commander(user_id) and user_id != ticket["user_id"] and user_id != ticket.get("assigned_to"):
         await callback.answer("❌ Insufficient permissions to close the ticket!")
         return
     
     # Update status
-    ticket["status"] = "closed"
-    ticket["closed_at"] = datetime.now().isoformat()
-    ticket["updated_at"] = datetime.now().isoformat()
+    data_manager.set_ticket_status(ticket, TicketStatus.CLOSED)
+    now = datetime.now()
+    ticket["closed_at"] = now.isoformat()
+    data_manager.touch_ticket(ticket, now)
     
-    # Notify all parties
+    # Notify all parties: the user and supervisors are updated in parallel
     user_id_ticket = ticket["user_id"]
-    try:
-        await bot.send_message(
-            user_id_ticket,
-            f"✅ <b>Your ticket {ticket_id} has been closed.</b>\n"
-            "If your issue is resolved, thank you for your cooperation!\n"
-            "If you need further assistance, you can create a new ticket."
-        )
-    except TelegramForbiddenError:
-        logger.warning(f"User {user_id_ticket} blocked the bot. Removing from database.")
-        remove_user_from_database(user_id_ticket)
-    except Exception as e:
-        logger.error(f"Error notifying user {user_id_ticket}: {e}")
-    
-    # Notify supervisors
-    for supervisor_id in data_manager.data["command"]["ticket_responses"].get(ticket_id, {}):
-        try:
-            # Remove keyboard markup from messages
-            await bot.edit_message_reply_markup(
+    responses = command_state["ticket_responses"].get(ticket_id, {})
+    await asyncio.gather(
+        fan_out(
+            [user_id_ticket],
+            lambda uid: bot.send_message(
+                uid,
+                f"✅ <b>Your ticket {ticket_id} has been closed.</b>\n"
+                "If your issue is resolved, thank you for your cooperation!\n"
+                "If you need further assistance, you can create a new ticket."
+            ),
+            "ticket closure notice"
+        ),
+        # Remove keyboard markup from supervisor messages
+        fan_out(
+            responses,
+            lambda supervisor_id: bot.edit_message_reply_markup(
                 chat_id=supervisor_id,
-                message_id=data_manager.data["command"]["ticket_responses"][ticket_id][supervisor_id]["message_id"],
+                message_id=responses[supervisor_id]["message_id"],
                 reply_markup=None
-            )
-        except Exception as e:
-            logger.error(f"Error updating supervisor message {supervisor_id}: {e}")
+            ),
+            "ticket closure update"
+        )
+    )
     
     # Clear active references
-    if user_id_ticket in data_manager.data["command"]["user_active_tickets"]:
-        del data_manager.data["command"]["user_active_tickets"][user_id_ticket]
+    command_state["user_active_tickets"].pop(user_id_ticket, None)
     
-    data_manager.save_data()
+    data_manager.mark_dirty()
     await callback.answer("🔒 Ticket closed")
 
 # --- ФОНОВЫЕ ЗАДАЧИ ---
@@ -1346,27 +1873,25 @@ async def auto_save_task():
     """Background task for auto-saving data"""
     while True:
         await asyncio.sleep(Config.AUTO_SAVE_INTERVAL)
-        data_manager.save_data()
+        await data_manager.save_data()
 
 async def cleanup_tickets():
     """Cleanup of expired tickets"""
     while True:
         await asyncio.sleep(3600)  # Every hour
-        now = datetime.now()
-        expired_tickets = []
-        
-        for ticket_id, ticket in data_manager.data["command"]["tickets"].items():
-            if ticket["status"] == "closed":
-                continue
-            
-            updated_at = datetime.fromisoformat(ticket["updated_at"])
-            if (now - updated_at).total_seconds() > Config.TICKET_TIMEOUT * 3600:
-                expired_tickets.append(ticket_id)
+        expired_tickets = data_manager.pop_expired_tickets(time.time())
         
+        tickets = data_manager.data["command"]["tickets"]
         for ticket_id in expired_tickets:
-            ticket = data_manager.data["command"]["tickets"][ticket_id]
+            ticket = tickets.get(ticket_id)
+            if ticket is None:
+                # Deleted along with a user removed earlier in this pass
+                continue
             user_id = ticket["user_id"]
             
+            # Close before notifying: a blocked user is removed together with the ticket
+            data_manager.set_ticket_status(ticket, TicketStatus.CLOSED)
+            
             # Notify the user
             try:
                 await bot.send_message(
@@ -1379,12 +1904,9 @@ async def cleanup_tickets():
                 remove_user_from_database(user_id)
             except Exception as e:
                 logger.error(f"Error notifying user {user_id}: {e}")
-            
-            # Close the ticket
-            ticket["status"] = "closed"
         
         if expired_tickets:
-            data_manager.save_data()
+            data_manager.mark_dirty()
             logger.info(f"Closed {len(expired_tickets)} expired tickets")
 
 # --- SYSTEM STARTUP ---
@@ -1393,58 +1915,50 @@ async def on_startup():
     logger.info("Starting Cyber Guard system")
     
     # Launch background tasks
+    asyncio.create_task(data_manager.flush_loop())
     asyncio.create_task(auto_save_task())
     asyncio.create_task(cleanup_tickets())
     
-    # Notify administrators
-    for admin_id in Config.ADMIN_IDS:
+    # Notify administrators in parallel so one slow chat doesn't delay the rest
+    startup_message = (
+        "🟢 <b>Cyber Guard system is now online!</b>\n"
+        f"Version: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
+        f"Active tickets: {data_manager.open_ticket_count()}"
+    )
+    async def notify_admin(admin_id: int):
         try:
-            await bot.send_message(
-                admin_id,
-                "🟢 <b>Cyber Guard system is now online!</b>\n"
-                f"Version: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
-                f"Active tickets: {sum(1 for t in data_manager.data['command']['tickets'].values() if t['status'] != 'closed')}"
-            )
+            await asyncio.wait_for(bot.send_message(admin_id, startup_message), Config.STARTUP_NOTIFY_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out notifying administrator {admin_id}")
         except Exception as e:
             logger.error(f"Error notifying administrator {admin_id}: {e}")
+    await asyncio.gather(*(notify_admin(admin_id) for admin_id in Config.ADMIN_IDS))
 
 async def on_shutdown():
     """Actions performed during system shutdown"""
     logger.info("System shutdown initiated")
-    data_manager.save_data()
+    await data_manager.save_data()
 
 # --- MISSION SYSTEM ---
 @main_router.message(F.text == ButtonText.COMBAT_READY)
 async def handle_combat_ready(message: Message):
     """Handler for readiness confirmation"""
     user_id = message.from_user.id
-    data_manager.data["command"]["activity"][user_id] = datetime.now()
+    data_manager.touch_activity(user_id)
     
     if user_id in data_manager.data["combat_ready"]:
         await message.answer(
             "ℹ️ <b>You are already on duty!</b>\n"
             "Await mission assignments.",
-            reply_markup=create_unit_keyboard()
+            reply_markup=UNIT_KEYBOARD
         )
     else:
         data_manager.data["combat_ready"].add(user_id)
-        data_manager.save_data()
-        try:
-            await bot.send_message(
-                user_id,
-                f"✅ <b>Ready status confirmed!</b>\n"
-                "Await mission assignments.",
-                reply_markup=create_unit_keyboard()
-            )
-        except TelegramForbiddenError:
-            logger.warning(f"User {user_id} blocked the bot. Removing from database.")
-            remove_user_from_database(user_id)
-        except Exception as e:
-            logger.error(f"Error sending message to user {user_id}: {e}")
+        data_manager.log_op("combat_ready", user_id)
         await message.answer(
             "✅ <b>Ready status confirmed!</b>\n"
             "Await mission assignments.",
-            reply_markup=create_unit_keyboard()
+            reply_markup=UNIT_KEYBOARD
         )
 
 # --- TICKET SYSTEM ---
@@ -1471,16 +1985,22 @@ async def handle_respond_ticket(callback: CallbackQuery):
     )
     await callback.answer()
 
-@main_router.message(
-    lambda m: m.from_user.id in data_manager.data["command"]["temp_actions"] and
-    data_manager.data["command"]["temp_actions"][m.from_user.id]["action"].startswith("respond_ticket_") and
-    data_manager.data["command"]["temp_actions"][m.from_user.id]["step"] == "awaiting_text"
-)
+class RespondTicketFilter(Filter):
+    """Messages from a moderator who is typing a ticket response"""
+    async def __call__(self, message: Message) -> bool:
+        temp_action = data_manager.data["command"]["temp_actions"].get(message.from_user.id)
+        return bool(
+            temp_action and
+            temp_action["action"].startswith("respond_ticket_") and
+            temp_action["step"] == "awaiting_text"
+        )
+
+@main_router.message(RespondTicketFilter())
 async def handle_respond_ticket_text(message: Message):
     """Handle moderator's response text for a ticket"""
     moderator_id = message.from_user.id
     action = data_manager.data["command"]["temp_actions"][moderator_id]["action"]
-    ticket_id = action.replace("respond_ticket_", "")
+    ticket_id = action.removeprefix("respond_ticket_")
     if ticket_id not in data_manager.data["command"]["tickets"]:
         await message.answer("❌ Ticket not found!")
         del data_manager.data["command"]["temp_actions"][moderator_id]
@@ -1488,18 +2008,22 @@ async def handle_respond_ticket_text(message: Message):
     ticket = data_manager.data["command"]["tickets"][ticket_id]
     response_text = message.text.strip()
     # Add response
+    now = datetime.now()
     ticket.setdefault("responses", []).append({
         "moderator_id": moderator_id,
         "text": response_text,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now.isoformat(),
+        "time_ts": now.timestamp()
     })
-    ticket["updated_at"] = datetime.now().isoformat()
+    data_manager.touch_ticket(ticket, now)
     # Notify the user
     user_id = ticket["user_id"]
     try:
+        # Forwarded text goes out as plain text, it may contain HTML special characters
         await bot.send_message(
             user_id,
-            f"✉️ <b>Response to your ticket {ticket_id}:</b>\n{response_text}"
+            f"✉️ Response to your ticket {ticket_id}:\n{response_text}",
+            parse_mode=None
         )
     except TelegramForbiddenError:
         logger.warning(f"User {user_id} blocked the bot. Removing from database.")
@@ -1508,9 +2032,53 @@ async def handle_respond_ticket_text(message: Message):
         logger.error(f"Error sending response to user {user_id}: {e}")
     await message.answer("✅ Response has been sent.")
     del data_manager.data["command"]["temp_actions"][moderator_id]
-    data_manager.save_data()
+    data_manager.mark_dirty()
 
 # --- Mission completion button for moderators ---
+# Missions whose completion notices are being sent; updates are handled concurrently
+finishing_missions: Set[str] = set()
+# Running completion broadcasts, referenced so they aren't garbage collected
+finish_tasks: Set[asyncio.Task] = set()
+
+def start_finish_mission(mission: dict) -> Optional[asyncio.Task]:
+    """Complete the mission and start notifying its participants; None if there is nothing left to do"""
+    if mission["id"] in finishing_missions:
+        return None
+    notified_by = mission.setdefault("notified_by", set())
+    pending = mission["completed_by"] - notified_by
+    if mission["status"] == MissionStatus.COMPLETED and not pending:
+        return None
+    if mission["status"] != MissionStatus.COMPLETED:
+        data_manager.set_mission_status(mission, MissionStatus.COMPLETED)
+        mission["completed_at"] = datetime.now().isoformat()
+    # Notify only those who completed the mission and have not been told yet
+    notice = f"✅ <b>Mission '{mission.get('name', mission['id'])}' has been completed by moderator!</b>"
+    async def notify(uid: int):
+        result = await bot.send_message(uid, notice)
+        # Record each delivery right away so a restart mid-broadcast resends only the rest
+        notified_by.add(uid)
+        data_manager.mark_dirty()
+        return result
+    async def broadcast():
+        try:
+            await fan_out(pending, notify, "mission completion notice")
+        finally:
+            finishing_missions.discard(mission["id"])
+    data_manager.mark_dirty()
+    finishing_missions.add(mission["id"])
+    task = asyncio.create_task(broadcast())
+    finish_tasks.add(task)
+    task.add_done_callback(finish_tasks.discard)
+    return task
+
+async def finish_mission(mission: dict) -> bool:
+    """Complete the mission and wait until its participants are notified"""
+    task = start_finish_mission(mission)
+    if task is None:
+        return False
+    await task
+    return True
+
 @main_router.callback_query(F.data.startswith("finish_mission:"))
 async def handle_finish_mission(callback: CallbackQuery):
     mission_id = callback.data.split(":")[1]
@@ -1519,58 +2087,34 @@ async def handle_finish_mission(callback: CallbackQuery):
     if not user_is_commander:
         await callback.answer("❌ Insufficient permissions!")
         return
-    if mission_id not in data_manager.data["missions"]["archive"]:
+    mission = data_manager.data["missions"]["archive"].get(mission_id)
+    if mission is None:
         await callback.answer("❌ Mission not found!")
         return
-    mission = data_manager.data["missions"]["archive"][mission_id]
-    if mission["status"] == MissionStatus.COMPLETED:
+    # The broadcast can outlast the callback answer window, so it runs in the background
+    if start_finish_mission(mission) is None:
         await callback.answer("Mission is already completed!")
         return
-    mission["status"] = MissionStatus.COMPLETED
-    mission["completed_at"] = datetime.now().isoformat()
-    data_manager.data["missions"]["archive"][mission_id] = mission
-    # Notify only those who completed the mission
-    for uid in mission.get("completed_by", set()):
-        try:
-            await bot.send_message(uid, f"✅ <b>Mission '{mission.get('name', mission_id)}' has been completed by moderator!</b>")
-        except TelegramForbiddenError:
-            logger.warning(f"User {uid} blocked the bot. Removing from database.")
-            remove_user_from_database(uid)
-        except Exception as e:
-            logger.error(f"Error notifying user {uid} about completion: {e}")
-    data_manager.save_data()
     await callback.answer("Mission completed!")
 
+
 @main_router.message(Command(commands=["finish_mission"]))
 async def handle_finish_mission_command(message: Message, command: CommandObject):
     user_id = message.from_user.id
-    if not is_commander(user_id) and not is_commander(user_id):
+    if not is_commander(user_id):
         await message.answer("❌ Insufficient permissions!")
         return
     if not command.args:
         await message.answer("Please specify mission ID: /finish_mission <id>")
         return
     mission_id = command.args.strip()
-    if mission_id not in data_manager.data["missions"]["archive"]:
+    mission = data_manager.data["missions"]["archive"].get(mission_id)
+    if mission is None:
         await message.answer("Mission not found!")
         return
-    mission = data_manager.data["missions"]["archive"][mission_id]
-    if mission["status"] == MissionStatus.COMPLETED:
+    if not await finish_mission(mission):
         await message.answer("Mission is already completed!")
         return
-    mission["status"] = MissionStatus.COMPLETED
-    mission["completed_at"] = datetime.now().isoformat()
-    data_manager.data["missions"]["archive"][mission_id] = mission
-    # Notify only those who completed the mission
-    for uid in mission.get("completed_by", set()):
-        try:
-            await bot.send_message(uid, f"✅ <b>Mission '{mission.get('name', mission_id)}' has been completed by moderator!</b>")
-        except TelegramForbiddenError:
-            logger.warning(f"User {uid} blocked the bot. Removing from database.")
-            remove_user_from_database(uid)
-        except Exception as e:
-            logger.error(f"Error notifying user {uid} about completion: {e}")
-    data_manager.save_data()
     await message.answer("Mission completed!")
 
 # --- SYSTEM STARTUP ---
@@ -1580,21 +2124,25 @@ async def main():
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
-    # Start the bot
-    await bot.delete_webhook(drop_pending_updates=True)
+    # Start the bot; bot.me() caches the bot info that start_polling needs
+    await asyncio.gather(bot.delete_webhook(drop_pending_updates=True), bot.me())
     logger.info("Bot is ready to work")
     await dp.start_polling(bot)
 
 # --- Ticket dialog: user section ---
-@main_router.message(
-    lambda m: (
-        m.from_user.id in data_manager.data["command"]["user_active_tickets"] and
-        data_manager.data["command"]["tickets"].get(
-            data_manager.data["command"]["user_active_tickets"][m.from_user.id], {}
-        ).get("status") == "in_progress" and
-        not (m.text and m.text.strip().startswith("/close"))
-    )
-)
+class UserDialogFilter(Filter):
+    """Messages from a user whose ticket is in progress, except /close"""
+    async def __call__(self, message: Message) -> bool:
+        command_state = data_manager.data["command"]
+        ticket_id = command_state["user_active_tickets"].get(message.from_user.id)
+        if ticket_id is None:
+            return False
+        ticket = command_state["tickets"].get(ticket_id)
+        if not ticket or ticket["status"] != TicketStatus.IN_PROGRESS:
+            return False
+        return not (message.text and message.text.lstrip().startswith("/close"))
+
+@main_router.message(UserDialogFilter())
 async def handle_ticket_dialog_user(message: Message):
     """Forward user messages to the assigned moderator for the ticket"""
     user_id = message.from_user.id
@@ -1605,38 +2153,45 @@ async def handle_ticket_dialog_user(message: Message):
         await message.answer("⏳ Your ticket is waiting to be assigned to a moderator.")
         return
     # Add message to ticket history
-    ticket.setdefault("messages", []).append({"from": "user", "text": message.text, "timestamp": datetime.now().isoformat()})
-    ticket["updated_at"] = datetime.now().isoformat()
-    data_manager.save_data()
+    now = datetime.now()
+    ticket.setdefault("messages", []).append(
+        {"from": "user", "text": message.text, "timestamp": now.isoformat(), "time_ts": now.timestamp()}
+    )
+    data_manager.touch_ticket(ticket, now)
+    data_manager.mark_dirty()
     # Forward to moderator
     try:
-        await bot.send_message(moderator_id, f"💬 <b>User message for ticket {ticket_id}:</b>\n{message.text}")
+        await bot.send_message(moderator_id, f"💬 User message for ticket {ticket_id}:\n{message.text}", parse_mode=None)
     except Exception as e:
         logger.error(f"Error forwarding message to moderator {moderator_id}: {e}")
     # Don't respond to user to avoid interrupting the dialog
 
 # --- Ticket dialog: moderator section ---
-@main_router.message(
-    lambda m: any(
-        t.get("assigned_to") == m.from_user.id and t["status"] == "in_progress"
-        for t in data_manager.data["command"]["tickets"].values()
-    ) and not (m.text and m.text.strip().startswith("/close"))
-)
+class ModeratorDialogFilter(Filter):
+    """Messages from a moderator with a ticket in progress, except /close"""
+    async def __call__(self, message: Message) -> bool:
+        if message.from_user.id not in data_manager.moderator_tickets:
+            return False
+        return not (message.text and message.text.lstrip().startswith("/close"))
+
+@main_router.message(ModeratorDialogFilter())
 async def handle_ticket_dialog_admin(message: Message):
     """Forward moderator's messages to the user for the ticket"""
     moderator_id = message.from_user.id
-    # Find ticket where this moderator is assigned_to and status is in_progress
-    ticket = next((t for t in data_manager.data["command"]["tickets"].values() if t.get("assigned_to") == moderator_id and t["status"] == "in_progress"), None)
+    ticket = data_manager.moderator_ticket(moderator_id)
     if not ticket:
         return
     user_id = ticket["user_id"]
     # Add message to ticket history
-    ticket.setdefault("responses", []).append({"moderator_id": moderator_id, "text": message.text, "timestamp": datetime.now().isoformat()})
-    ticket["updated_at"] = datetime.now().isoformat()
-    data_manager.save_data()
+    now = datetime.now()
+    ticket.setdefault("responses", []).append(
+        {"moderator_id": moderator_id, "text": message.text, "timestamp": now.isoformat(), "time_ts": now.timestamp()}
+    )
+    data_manager.touch_ticket(ticket, now)
+    data_manager.mark_dirty()
     # Forward to user
     try:
-        await bot.send_message(user_id, f"💬 <b>Response for ticket {ticket['id']}:</b>\n{message.text}")
+        await bot.send_message(user_id, f"💬 Response for ticket {ticket['id']}:\n{message.text}", parse_mode=None)
     except Exception as e:
         logger.error(f"Error forwarding message to user {user_id}: {e}")
     # Don't respond to moderator to avoid interrupting the dialog
@@ -1654,19 +2209,18 @@ async def handle_close_ticket_command(message: Message, command: CommandObject):
         ticket = data_manager.data["command"]["tickets"].get(ticket_id)
     # For moderator
     if not ticket:
-        for t in data_manager.data["command"]["tickets"].values():
-            if t.get("assigned_to") == user_id and t["status"] == "in_progress":
-                ticket_id = t["id"]
-                ticket = t
-                break
-    if not ticket or ticket["status"] == "closed":
+        ticket = data_manager.moderator_ticket(user_id)
+        if ticket:
+            ticket_id = ticket["id"]
+    if not ticket or ticket["status"] == TicketStatus.CLOSED:
         await message.answer("No active ticket to close.")
         return
     # Close the ticket
-    ticket["status"] = "closed"
-    ticket["closed_at"] = datetime.now().isoformat()
-    ticket["updated_at"] = datetime.now().isoformat()
-    data_manager.save_data()
+    data_manager.set_ticket_status(ticket, TicketStatus.CLOSED)
+    now = datetime.now()
+    ticket["closed_at"] = now.isoformat()
+    data_manager.touch_ticket(ticket, now)
+    data_manager.mark_dirty()
     # Notify both parties
     try:
         await bot.send_message(ticket["user_id"], f"✅ <b>Your ticket {ticket_id} has been closed.</b>\nThank you for the dialog!")
@@ -1684,45 +2238,20 @@ async def handle_close_ticket_command(message: Message, command: CommandObject):
 # --- Check moderator/admin permissions ---
 def is_commander(user_id: int) -> bool:
     """Check if the user is an administrator or moderator"""
-    return user_id in Config.ADMIN_IDS or user_id in data_manager.data["units"][UnitType.CENTURIONS]
+    return user_id in data_manager.commanders
 
 # --- Remove user from database when bot is blocked ---
 def remove_user_from_database(user_id: int):
     """Remove user from all database structures"""
-    # Remove from all units
-    for unit_type in UnitType.ALL_TYPES:
-        data_manager.data["units"][unit_type].discard(user_id)
-    # Remove from active users
-    data_manager.data["combat_ready"].discard(user_id)
-    # Remove from subscribers
-    data_manager.data["subscribers"].discard(user_id)
-    # Remove from call signs
-    data_manager.data["command"]["call_signs"].pop(user_id, None)
-    # Remove from activity
-    data_manager.data["command"]["activity"].pop(user_id, None)
-    # Remove from temporary actions
-    data_manager.data["command"]["temp_actions"].pop(user_id, None)
-    # Remove from temporary missions
-    data_manager.data["command"]["temp_missions"].pop(user_id, None)
-    # Remove from active tickets
-    data_manager.data["command"]["user_active_tickets"].pop(user_id, None)
-    # Remove from usernames
-    data_manager.data["usernames"].pop(str(user_id), None)
-    # Remove from ticket responses
-    for ticket_id in list(data_manager.data["command"]["ticket_responses"].keys()):
-        data_manager.data["command"]["ticket_responses"][ticket_id].pop(user_id, None)
-        if not data_manager.data["command"]["ticket_responses"][ticket_id]:
-            del data_manager.data["command"]["ticket_responses"][ticket_id]
-    # Remove user's tickets
-    for ticket_id in list(data_manager.data["command"]["tickets"].keys()):
-        ticket = data_manager.data["command"]["tickets"][ticket_id]
-        if ticket.get("user_id") == user_id or ticket.get("assigned_to") == user_id:
-            del data_manager.data["command"]["tickets"][ticket_id]
-    # Remove from completed missions
-    for mission in data_manager.data["missions"]["archive"].values():
-        if "completed_by" in mission and isinstance(mission["completed_by"], set):
-            mission["completed_by"].discard(user_id)
-    data_manager.save_data()
+    remove_users_from_database((user_id,))
+
+def remove_users_from_database(user_ids: Iterable[int]):
+    """Remove several users at once, requesting a single save"""
+    user_ids = list(user_ids)
+    data_manager.remove_users(user_ids)
+    # Logged as well, so a crash before the save doesn't replay the users back in
+    data_manager.log_op("remove_users", user_ids)
+    data_manager.mark_dirty()
 
 if __name__ == "__main__":
     try:
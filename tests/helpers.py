@@ -0,0 +1,42 @@
+import importlib
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_main():
+    """Import main.py without a real bot token"""
+    sys.modules.pop("main", None)
+    sys.path.insert(0, ROOT)
+    try:
+        with mock.patch("aiogram.client.bot.validate_token"):
+            return importlib.import_module("main")
+    finally:
+        sys.path.remove(ROOT)
+
+
+class MainTestCase(unittest.IsolatedAsyncioTestCase):
+    """Fresh main module working in a scratch directory"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+        root_logger = logging.getLogger()
+        handlers = list(root_logger.handlers)
+        self.main = load_main()
+        # basicConfig puts the log file handler on the root logger, not on main.logger
+        self.log_handlers = [h for h in root_logger.handlers if h not in handlers]
+
+    def tearDown(self):
+        root_logger = logging.getLogger()
+        for handler in self.log_handlers:
+            root_logger.removeHandler(handler)
+            handler.close()
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from tests.helpers import MainTestCase
+
+
+class FinishMissionTest(MainTestCase):
+    async def test_concurrent_finish_sends_one_notice_per_user(self):
+        main = self.main
+        mission = {
+            "id": "m1",
+            "name": "Alpha",
+            "type": "all",
+            "status": main.MissionStatus.ACTIVE,
+            "completed_by": {101, 102, 103},
+        }
+        main.data_manager.add_mission(mission)
+
+        async def send_message(chat_id, text, **kwargs):
+            await asyncio.sleep(0.05)
+            return mock.Mock(message_id=chat_id)
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(side_effect=send_message)
+        with mock.patch.object(main, "bot", bot):
+            results = await asyncio.gather(main.finish_mission(mission), main.finish_mission(mission))
+
+        self.assertEqual(sorted(results), [False, True])
+        recipients = [call.args[0] for call in bot.send_message.await_args_list]
+        self.assertEqual(sorted(recipients), [101, 102, 103])
+        self.assertEqual(mission["notified_by"], {101, 102, 103})
+        self.assertEqual(mission["status"], main.MissionStatus.COMPLETED)
+
+    async def test_finish_button_is_answered_before_broadcast(self):
+        main = self.main
+        main.data_manager.add_to_unit(1, main.UnitType.CENTURIONS)
+        mission = {
+            "id": "m1",
+            "name": "Alpha",
+            "type": "all",
+            "status": main.MissionStatus.ACTIVE,
+            "completed_by": {101, 102},
+        }
+        main.data_manager.add_mission(mission)
+        release = asyncio.Event()
+
+        async def send_message(chat_id, text, **kwargs):
+            await release.wait()
+            return mock.Mock(message_id=chat_id)
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(side_effect=send_message)
+        callback = mock.Mock(data="finish_mission:m1", from_user=mock.Mock(id=1))
+        callback.answer = mock.AsyncMock()
+        with mock.patch.object(main, "bot", bot):
+            await asyncio.wait_for(main.handle_finish_mission(callback), 1)
+            callback.answer.assert_awaited_once_with("Mission completed!")
+            self.assertEqual(mission["notified_by"], set())
+            release.set()
+            await asyncio.gather(*main.finish_tasks)
+
+        self.assertEqual(mission["notified_by"], {101, 102})
+
+    async def test_mission_targets_only_users_it_reached(self):
+
+        main = self.main
+        manager = main.data_manager
+        for user_id in (1, 2):
+            manager.add_to_unit(user_id, main.UnitType.PRIVATES)
+        mission = {
+            "id": "m1",
+            "name": "Alpha",
+            "type": "privates",
+            "status": main.MissionStatus.ACTIVE,
+            "completed_by": set(),
+        }
+        manager.add_mission(mission)
+
+        async def send_message(chat_id, text, **kwargs):
+            if chat_id == 2:
+                raise main.TelegramForbiddenError(method=mock.Mock(), message="blocked")
+            return mock.Mock(message_id=chat_id)
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(side_effect=send_message)
+        with mock.patch.object(main, "bot", bot):
+            await main.distribute_mission(mission, main.mission_targets("privates"))
+
+        self.assertEqual(mission["recipients"], {1})
+        self.assertEqual(mission["total_targets"], 1)
+        manager.add_to_unit(3, main.UnitType.PRIVATES)
+        self.assertEqual(mission["total_targets"], 1)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
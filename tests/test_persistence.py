@@ -0,0 +1,114 @@
+import os
+import unittest
+
+from tests.helpers import MainTestCase
+
+
+class CrashRecoveryTest(MainTestCase):
+    def restart(self, manager):
+        """Drop the manager without saving, as a killed process would"""
+        if manager._wal is not None:
+            manager._wal.close()
+        return self.main.DataManager()
+
+    async def test_replayed_unit_changes_update_mission_targets(self):
+        main = self.main
+        manager = main.data_manager
+        for user_id in (1, 2, 3):
+            manager.add_to_unit(user_id, main.UnitType.PRIVATES)
+        mission = {
+            "id": "m1",
+            "name": "Alpha",
+            "type": "privates",
+            "status": main.MissionStatus.ACTIVE,
+            "completed_by": {2},
+            "recipients": {1, 2, 3},
+            "total_targets": 3,
+        }
+        manager.add_mission(mission)
+        self.assertTrue(await manager.save_data())
+
+        # Joins never received the mission, leaving it only releases users who haven't completed it
+        for op, user_id in (("unit_add", 4), ("unit_remove", 1), ("unit_remove", 2)):
+            if op == "unit_add":
+                manager.add_to_unit(user_id, main.UnitType.PRIVATES)
+            else:
+                manager.remove_from_unit(user_id, main.UnitType.PRIVATES)
+            manager.log_op(op, user_id, main.UnitType.PRIVATES)
+        self.assertEqual(mission["total_targets"], 2)
+
+        reloaded = self.restart(manager)
+        reloaded_mission = reloaded.data["missions"]["archive"]["m1"]
+        self.assertEqual(reloaded.data["units"][main.UnitType.PRIVATES], {3, 4})
+        self.assertEqual(reloaded_mission["total_targets"], 2)
+        self.assertEqual(reloaded_mission["recipients"], {2, 3})
+        self.assertEqual(reloaded.sorted_unit_members(main.UnitType.PRIVATES), [3, 4])
+
+    async def test_replayed_removal_keeps_users_out(self):
+        main = self.main
+        manager = main.data_manager
+        for user_id in (1, 2):
+            manager.data["subscribers"].add(user_id)
+            manager.log_op("subscribe", user_id)
+            manager.add_to_unit(user_id, main.UnitType.PRIVATES)
+            manager.log_op("unit_add", user_id, main.UnitType.PRIVATES)
+        main.remove_users_from_database([1])
+
+        reloaded = self.restart(manager)
+        self.assertEqual(reloaded.data["subscribers"], {2})
+        self.assertEqual(reloaded.data["units"][main.UnitType.PRIVATES], {2})
+
+    async def test_unchanged_username_is_not_logged(self):
+        main = self.main
+        manager = main.data_manager
+        for username in ("alpha", "alpha", None, "bravo", "bravo"):
+            manager.set_username(1, username)
+        manager._wal.close()
+        with open(manager._wal_path(manager._wal_generation), "rb") as f:
+            ops = [main.msgspec.msgpack.decode(payload) for payload in main.iter_frames(f.read())]
+        self.assertEqual([op["args"] for op in ops], [[1, "alpha"], [1, None], [1, "bravo"]])
+
+    async def test_backup_and_kept_wal_rebuild_state(self):
+
+        main = self.main
+        manager = main.data_manager
+        saves = main.Config.BACKUP_EVERY + 3
+        for user_id in range(1, saves + 2):
+            manager.data["subscribers"].add(user_id)
+            manager.log_op("subscribe", user_id)
+            manager.add_to_unit(user_id, main.UnitType.PRIVATES)
+            manager.log_op("unit_add", user_id, main.UnitType.PRIVATES)
+            manager.data["command"]["call_signs"][user_id] = f"Unit-{user_id}"
+            manager.log_op("call_sign", user_id, f"Unit-{user_id}")
+            if user_id > 2:
+                manager.remove_from_unit(user_id - 2, main.UnitType.PRIVATES)
+                manager.log_op("unit_remove", user_id - 2, main.UnitType.PRIVATES)
+            if user_id <= saves:  # The last changes are only in the log
+                self.assertTrue(await manager.save_data())
+        self.assertTrue(os.path.exists(main.Config.BACKUP_FILE))
+        with open(main.Config.DATA_FILE, "wb") as f:
+            f.write(b"garbage")
+
+        reloaded = self.restart(manager)
+        self.assertEqual(reloaded.data["units"], manager.data["units"])
+        self.assertEqual(reloaded.data["subscribers"], manager.data["subscribers"])
+        self.assertEqual(reloaded.data["command"]["call_signs"], manager.data["command"]["call_signs"])
+
+    async def test_save_after_backup_load_keeps_backup(self):
+        main = self.main
+        manager = main.data_manager
+        manager.data["subscribers"].add(1)
+        self.assertTrue(await manager.save_data())
+        os.replace(main.Config.DATA_FILE, main.Config.BACKUP_FILE)
+        with open(main.Config.DATA_FILE, "wb") as f:
+            f.write(b"garbage")
+
+        reloaded = self.restart(manager)
+        self.assertEqual(reloaded.data["subscribers"], {1})
+        self.assertTrue(await reloaded.save_data())
+        backup = main.DataManager._read_snapshot(main.Config.BACKUP_FILE)
+        self.assertEqual(backup["subscribers"], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()